@@ -0,0 +1,76 @@
+import hashlib
+import logging
+
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import schemas
+from app.cache import TTLCache
+from app.database import get_db
+from app.local_cache import local_cache
+from app.metrics import CACHE_LOOKUPS, CACHE_REBUILDS
+from app.redis_client import REDIS_FAILURES, redis_client
+from app.repository.user_repository import UserRepository
+
+# The local cache is per worker. Revocations reach every worker over the L1
+# invalidation channel; while a worker is not subscribed to it, the TTL bounds
+# how long a revoked key keeps working there.
+LOCAL_AUTH_CACHE_SIZE = 10000
+LOCAL_AUTH_CACHE_TTL = 30
+REDIS_AUTH_CACHE_TTL = 60 * 60
+
+# Keyed by auth_key(), like Redis, since the channel carries the keys.
+local_auth_cache = TTLCache(maxsize=LOCAL_AUTH_CACHE_SIZE, ttl=LOCAL_AUTH_CACHE_TTL)
+local_cache.link(local_auth_cache)
+
+logger = logging.getLogger(__name__)
+
+
+def auth_key(api_key: str) -> str:
+    # API keys are credentials; only their digest is written to Redis.
+    return f"Auth: {hashlib.sha256(api_key.encode()).hexdigest()}"
+
+
+async def invalidate_api_key(api_key: str):
+    """Forget a cached API key on every worker. Call this whenever a key is
+    revoked or rotated."""
+    key = auth_key(api_key)
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(key)
+    local_cache.queue_invalidation(pipe, [key])
+    await pipe.execute()
+
+
+async def get_current_user(
+    api_key: str = Header(...), db: AsyncSession = Depends(get_db)
+) -> schemas.CurrentUser:
+    key = auth_key(api_key)
+    user = local_auth_cache.get(key)
+    if user:
+        CACHE_LOOKUPS.labels("Auth", "local_hit").inc()
+        return user
+
+    try:
+        cached_user = await redis_client.get(key)
+    except REDIS_FAILURES:
+        cached_user = None
+    if cached_user:
+        user = schemas.CurrentUser.model_validate_json(cached_user)
+        local_auth_cache.set(key, user)
+        CACHE_LOOKUPS.labels("Auth", "hit").inc()
+        return user
+
+    CACHE_LOOKUPS.labels("Auth", "miss").inc()
+    db_user = await UserRepository(db).get_user_by_api_key(api_key)
+    if not db_user:
+        logger.warning(f"Invalid API key: {api_key}")
+        raise HTTPException(status_code=403, detail="Invalid API key")
+
+    user = schemas.CurrentUser(id=db_user.id, name=db_user.name)
+    CACHE_REBUILDS.labels("Auth").inc()
+    try:
+        await redis_client.set(key, user.model_dump_json(), ex=REDIS_AUTH_CACHE_TTL)
+    except REDIS_FAILURES as exc:
+        logger.warning(f"API key not cached, Redis unavailable: {exc!r}")
+    local_auth_cache.set(key, user)
+    return user
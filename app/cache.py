@@ -0,0 +1,331 @@
+import asyncio
+import logging
+import math
+import random
+import time
+import uuid
+from collections import OrderedDict
+from functools import cached_property
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from app import codec
+from app.metrics import record_cache_lookups, record_cache_rebuilds
+from app.redis_client import REDIS_FAILURES
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Bounded in-process cache with per-entry expiry and LRU eviction.
+
+    Lives in a single worker process, so readers get values without a
+    network round-trip; callers are responsible for invalidating it.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+# Stored in place of a value the loader did not return (e.g. a deleted tweet),
+# so concurrent and following readers do not all go back to the database.
+ABSENT = b"-"
+ABSENT_TTL = 10
+
+
+def lock_key(key: str) -> str:
+    return f"Lock: {key}"
+
+
+class StaleWhileRevalidateCache:
+    """Redis cache that protects its loaders from stampedes.
+
+    Values are stored with a soft and a hard TTL. Until the soft TTL passes
+    the value is fresh; between the two it is stale, and one caller (the one
+    that wins a per-key Redis lock) recomputes it while everybody else keeps
+    getting the stale value. When nothing is cached at all, only the lock
+    holder computes and the others wait for its result, until it stores the
+    value or releases the lock. Keys the loader leaves out are remembered as
+    absent for ``ABSENT_TTL`` seconds. Fresh values are
+    also refreshed early with a probability that rises as the soft TTL
+    approaches (XFetch), scaled by how long the value took to compute, so
+    hot keys are rarely seen stale at all.
+
+    Values are kept as encoded JSON (see :mod:`app.codec`); the ``*_raw``
+    methods hand those bytes back without decoding them.
+
+    With ``local`` (a :class:`app.local_cache.LocalCache`) the encoded values
+    are also kept in process memory, and writes made through :meth:`set_many`
+    and :meth:`delete` evict them in every worker.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        soft_ttl: float,
+        hard_ttl: int,
+        lock_timeout: int = 5,
+        beta: float = 1.0,
+        local=None,
+    ):
+        self.redis = redis_client
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.lock_timeout = lock_timeout
+        self.beta = beta
+        self.local = local
+
+    @cached_property
+    def _release_lock(self):
+        return self.redis.register_script(RELEASE_LOCK_SCRIPT)
+
+    def _needs_refresh(self, soft_expires_at: float, delta: float) -> bool:
+        early = -delta * self.beta * math.log(1.0 - random.random())
+        return time.time() + early >= soft_expires_at
+
+    async def _lock(self, keys: List[str], token: str) -> List[str]:
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.set(lock_key(key), token, nx=True, ex=self.lock_timeout)
+        acquired = await pipe.execute()
+        return [key for key, ok in zip(keys, acquired) if ok]
+
+    async def _unlock(self, keys: List[str], token: str):
+        for key in keys:
+            await self._release_lock(keys=[lock_key(key)], args=[token])
+
+    async def _compute(
+        self,
+        keys: List[str],
+        compute_many: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, bytes]:
+        started = time.monotonic()
+        values = await compute_many(keys)
+        record_cache_rebuilds(values)
+        pipe = self.redis.pipeline(transaction=False)
+        encoded = self._queue_store(pipe, values, time.monotonic() - started)
+        for key in keys:
+            if key not in values:
+                pipe.set(key, ABSENT, ex=ABSENT_TTL)
+        await pipe.execute()
+        return encoded
+
+    def _queue_store(
+        self, pipe, values: Dict[str, Any], delta: float
+    ) -> Dict[str, bytes]:
+        encoded = {key: codec.dumps(value) for key, value in values.items()}
+        soft_expires_at = time.time() + self.soft_ttl
+        for key, payload in encoded.items():
+            pipe.set(key, codec.pack(payload, soft_expires_at, delta), ex=self.hard_ttl)
+        return encoded
+
+    async def _store(self, values: Dict[str, Any], delta: float) -> Dict[str, bytes]:
+        pipe = self.redis.pipeline(transaction=False)
+        encoded = self._queue_store(pipe, values, delta)
+        if encoded:
+            await pipe.execute()
+        return encoded
+
+    async def _wait_for(self, keys: List[str]) -> Dict[str, Optional[bytes]]:
+        """Wait for the lock holders of ``keys``. Returns the values they
+        stored, and None for keys they found absent; keys whose holder gave
+        up without storing anything are left out."""
+        values: Dict[str, Optional[bytes]] = {}
+        deadline = time.monotonic() + self.lock_timeout
+        while keys and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.mget(keys)
+            for key in keys:
+                pipe.exists(lock_key(key))
+            raws, *locked = await pipe.execute()
+            waiting = []
+            for key, raw, is_locked in zip(keys, raws, locked):
+                unpacked = codec.unpack(raw) if raw is not None else None
+                if raw == ABSENT:
+                    values[key] = None
+                elif unpacked is not None:
+                    values[key] = unpacked[0]
+                elif is_locked:
+                    waiting.append(key)
+            keys = waiting
+        return values
+
+    async def get_many_raw(
+        self,
+        keys: List[str],
+        compute_many: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, bytes]:
+        """Return encoded values for ``keys``; ``compute_many`` loads a batch
+        of missing or stale keys and returns them as a dict. Keys it leaves
+        out are treated as not existing, and are remembered as such for
+        ``ABSENT_TTL`` seconds.
+
+        When Redis is unavailable every key is computed, uncached."""
+        if not keys:
+            return {}
+        if self.local is None:
+            return await self._get_many_raw_or_compute(keys, compute_many)
+
+        # Taken before Redis is read, so that values an invalidation
+        # overtakes are not kept (see LocalCache.set_many).
+        version = self.local.version
+        values = self.local.get_many(keys)
+        record_cache_lookups("local_hit", list(values))
+        missing = [key for key in keys if key not in values]
+        if missing:
+            fetched = await self._get_many_raw_or_compute(missing, compute_many)
+            self.local.set_many(fetched, version)
+            values.update(fetched)
+        return values
+
+    async def _get_many_raw_or_compute(
+        self,
+        keys: List[str],
+        compute_many: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, bytes]:
+        try:
+            return await self._get_many_raw(keys, compute_many)
+        except REDIS_FAILURES as exc:
+            logger.warning(f"Cache bypassed, Redis unavailable: {exc!r}")
+            record_cache_lookups("bypass", keys)
+            values = await compute_many(keys)
+            return {key: codec.dumps(value) for key, value in values.items()}
+
+    async def _get_many_raw(
+        self,
+        keys: List[str],
+        compute_many: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, bytes]:
+        values: Dict[str, bytes] = {}
+        fresh, missing, stale = [], [], []
+        for key, raw in zip(keys, await self.redis.mget(keys)):
+            if raw == ABSENT:
+                fresh.append(key)
+                continue
+            unpacked = codec.unpack(raw) if raw is not None else None
+            if unpacked is None:
+                missing.append(key)
+                continue
+            values[key], soft_expires_at, delta = unpacked
+            if self._needs_refresh(soft_expires_at, delta):
+                stale.append(key)
+            else:
+                fresh.append(key)
+        record_cache_lookups("hit", fresh)
+        record_cache_lookups("stale", stale)
+        record_cache_lookups("miss", missing)
+
+        if not missing and not stale:
+            return values
+
+        token = uuid.uuid4().hex
+        locked = await self._lock(missing + stale, token)
+        try:
+            if locked:
+                computed = await self._compute(locked, compute_many)
+                for key in locked:
+                    values.pop(key, None)
+                values.update(computed)
+        finally:
+            await self._unlock(locked, token)
+
+        waiting = [key for key in missing if key not in locked]
+        if waiting:
+            settled = await self._wait_for(waiting)
+            values.update(
+                (key, value) for key, value in settled.items() if value is not None
+            )
+            # The lock holder failed or timed out; load what is still missing.
+            leftover = [key for key in waiting if key not in settled]
+            if leftover:
+                values.update(await self._compute(leftover, compute_many))
+        return values
+
+    async def get_many(
+        self,
+        keys: List[str],
+        compute_many: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        values = await self.get_many_raw(keys, compute_many)
+        return {key: codec.loads(payload) for key, payload in values.items()}
+
+    async def get_raw(
+        self, key: str, compute: Callable[[], Awaitable[Any]]
+    ) -> Optional[bytes]:
+        async def compute_many(keys: List[str]) -> Dict[str, Any]:
+            value = await compute()
+            return {} if value is None else {key: value}
+
+        return (await self.get_many_raw([key], compute_many)).get(key)
+
+    async def get(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Like :meth:`get_many` for one key; ``compute`` returns None when
+        the value does not exist."""
+        payload = await self.get_raw(key, compute)
+        return codec.loads(payload) if payload is not None else None
+
+    async def set_many(self, values: Dict[str, Any], delta: float = 0.0, writes=None):
+        """Store ``values``; with ``writes`` (a request's pipeline, see
+        :func:`app.redis_client.get_cache_writes`) the commands are only
+        queued on it."""
+        if writes is None and self.local is None:
+            await self._store(values, delta)
+            return
+        pipe = writes if writes is not None else self.redis.pipeline(transaction=True)
+        self._queue_store(pipe, values, delta)
+        self._queue_invalidation(pipe, list(values))
+        if writes is None:
+            await pipe.execute()
+
+    async def set(self, key: str, value: Any, writes=None):
+        await self.set_many({key: value}, writes=writes)
+
+    async def delete(self, *keys: str, writes=None):
+        if writes is None and self.local is None:
+            await self.redis.delete(*keys)
+            return
+        pipe = writes if writes is not None else self.redis.pipeline(transaction=True)
+        pipe.delete(*keys)
+        self._queue_invalidation(pipe, list(keys))
+        if writes is None:
+            await pipe.execute()
+
+    def _queue_invalidation(self, pipe, keys: List[str]):
+        if self.local is not None:
+            self.local.queue_invalidation(pipe, keys)
@@ -0,0 +1,45 @@
+import struct
+import zlib
+from typing import Any, Optional, Tuple
+
+import orjson
+
+from app.config import settings
+
+PLAIN = b"j"
+COMPRESSED = b"z"
+
+# Flag byte, soft expiry timestamp and recompute time in seconds.
+HEADER = struct.Struct("!cdd")
+
+
+def dumps(value: Any) -> bytes:
+    return orjson.dumps(value)
+
+
+def loads(data: bytes) -> Any:
+    return orjson.loads(data)
+
+
+def pack(payload: bytes, soft_expires_at: float, delta: float) -> bytes:
+    """Wrap encoded JSON in the cache envelope, compressing it once it is
+    larger than ``cache_compress_threshold`` bytes."""
+    flag = PLAIN
+    threshold = settings.cache_compress_threshold
+    if threshold and len(payload) >= threshold:
+        compressed = zlib.compress(payload, settings.cache_compress_level)
+        if len(compressed) < len(payload):
+            flag, payload = COMPRESSED, compressed
+    return HEADER.pack(flag, soft_expires_at, delta) + payload
+
+
+def unpack(raw: bytes) -> Optional[Tuple[bytes, float, float]]:
+    """Return ``(payload, soft_expires_at, delta)``, or None for values that
+    were not written by :func:`pack` and should be treated as missing."""
+    if len(raw) < HEADER.size or raw[:1] not in (PLAIN, COMPRESSED):
+        return None
+    flag, soft_expires_at, delta = HEADER.unpack_from(raw)
+    payload = raw[HEADER.size :]
+    if flag == COMPRESSED:
+        payload = zlib.decompress(payload)
+    return payload, soft_expires_at, delta
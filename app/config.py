@@ -1,16 +1,89 @@
-# import dotenv
-# from pydantic_settings import BaseSettings
-# import os
-#
-# class Settings(BaseSettings):
-#     dotenv.load_dotenv()
-#     db_user: str = os.getenv("DB_USER")
-#     db_password: str = os.getenv("DB_PASSWORD")
-#     db_host: str = os.getenv("DB_HOST")
-#     db_port: int = os.getenv("5432")
-#     db_name: str = os.getenv("twitterClone")
-#
-#     class Config:
-#         env_file = ".env"
-#
-# settings = Settings()
+from typing import Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    db_user: str = "postgres"
+    db_password: str = "postgres"
+    db_host: str = "db"
+    db_port: int = 5432
+    db_name: str = "twitterClone"
+    # A streaming replica for GET routes; without it every query uses the primary.
+    db_replica_host: Optional[str] = None
+    db_replica_port: Optional[int] = None
+
+    redis_host: str = "redis"
+    redis_port: int = 6379
+    redis_max_connections: int = 100
+    # Seconds to wait for a free pooled connection, and for Redis to answer.
+    redis_pool_timeout: float = 1.0
+    redis_socket_timeout: float = 0.5
+    redis_connect_timeout: float = 0.5
+    redis_health_check_interval: int = 30
+    # After this many connection errors or timeouts in a row, Redis is skipped
+    # for redis_breaker_reset seconds and requests are served from the database.
+    redis_breaker_failures: int = 5
+    redis_breaker_reset: float = 5.0
+
+    # Create the demo users (api keys "test" and "test2") on startup.
+    seed_test_users: bool = True
+    readiness_timeout: float = 2.0
+
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 30 * 60
+    db_pool_pre_ping: bool = True
+    db_statement_timeout_ms: int = 5000
+    # After a write, the same user's reads stay on the primary for this many
+    # seconds so they see their own changes despite replication lag (0 = off).
+    read_your_writes_window: float = 5.0
+
+    media_dir: str = "uploads"
+    media_max_upload_size: int = 10 * 1024 * 1024
+    media_chunk_size: int = 64 * 1024
+    # Uploads not attached to a tweet within this many seconds are deleted,
+    # releasing their blobs; each worker checks every media_sweep_interval
+    # seconds (0 = off).
+    media_unattached_ttl: int = 24 * 60 * 60
+    media_sweep_interval: float = 60 * 60
+
+    # Cached feed entries may lag behind likes by about this many seconds.
+    feed_rebuild_delay: float = 0.5
+    feed_rebuild_lock_timeout: int = 10
+    # An entry waiting for a refresh expires after this many seconds, so a
+    # refresh lost to an error or a restart cannot leave it stale for longer.
+    feed_rebuild_max_staleness: int = 60
+
+    # Cached values at least this many bytes long are zlib-compressed (0 = off).
+    cache_compress_threshold: int = 4096
+    cache_compress_level: int = 1
+    # Serve cached feeds and profiles as stored bytes, skipping re-validation.
+    cache_raw_responses: bool = True
+    # Requests per second and burst allowed per API key in each route class
+    # (read, write, engagement = likes and follows); a rate of 0 = no limit.
+    rate_limit_read_rate: float = 20
+    rate_limit_read_burst: int = 60
+    rate_limit_write_rate: float = 1
+    rate_limit_write_burst: int = 20
+    rate_limit_engagement_rate: float = 5
+    rate_limit_engagement_burst: int = 30
+    # Writes one worker handles at once; more get 503 right away (0 = off).
+    max_concurrent_writes: int = 32
+
+    # Entries in each worker's in-memory cache (0 = off). Writes evict them
+    # at once; the TTL bounds how long a background refresh goes unnoticed.
+    local_cache_size: int = 10000
+    local_cache_ttl: float = 10.0
+
+    def database_url(self, host: Optional[str] = None, port: Optional[int] = None):
+        return (
+            f"postgresql+asyncpg://{self.db_user}:{self.db_password}@"
+            f"{host or self.db_host}:{port or self.db_port}/{self.db_name}"
+        )
+
+
+settings = Settings()
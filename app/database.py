@@ -1,28 +1,113 @@
-from sqlalchemy import create_engine
+from typing import Dict, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+
+from .config import settings
+
+SQLALCHEMY_DATABASE_URL = settings.database_url()
+SQLALCHEMY_REPLICA_DATABASE_URL = (
+    settings.database_url(settings.db_replica_host, settings.db_replica_port)
+    if settings.db_replica_host
+    else None
+)
+
+
+def create_engine_from_settings(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args={
+            "server_settings": {
+                "statement_timeout": str(settings.db_statement_timeout_ms)
+            }
+        },
+    )
+
+
+# Engines are created on first use, so importing the app never loads a DB
+# driver or touches the network.
+_engines: Dict[str, AsyncEngine] = {}
+_session_factories: Dict[str, async_sessionmaker] = {}
+
+
+def _get_engine(name: str, url: str) -> AsyncEngine:
+    if name not in _engines:
+        _engines[name] = create_engine_from_settings(url)
+        _session_factories[name] = async_sessionmaker(
+            bind=_engines[name], autoflush=False, expire_on_commit=False
+        )
+    return _engines[name]
 
 
-# from .config import settings
+def get_engine() -> AsyncEngine:
+    return _get_engine("primary", SQLALCHEMY_DATABASE_URL)
 
-# SQLALCHEMY_DATABASE_URL = (
-#     f"postgresql://{settings.db_user}:{settings.db_password}@"
-#     f"{settings.db_host}:{settings.db_port}/{settings.db_name}"
-# )
 
-SQLALCHEMY_DATABASE_URL = "postgresql://postgres:postgres@db:5432/twitterClone"
+def get_replica_engine() -> Optional[AsyncEngine]:
+    if SQLALCHEMY_REPLICA_DATABASE_URL is None:
+        return None
+    return _get_engine("replica", SQLALCHEMY_REPLICA_DATABASE_URL)
+
+
+async def dispose_engines():
+    for engine in _engines.values():
+        await engine.dispose()
+    _engines.clear()
+    _session_factories.clear()
 
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def get_session_factory():
+    """Session factory for work that outlives the request, e.g. background tasks."""
+    get_engine()
+    return _session_factories["primary"]
+
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with get_session_factory()() as db:
         yield db
-    finally:
-        db.close()
 
+
+async def get_replica_db():
+    """Session on the read replica, or None when no replica is configured."""
+    if get_replica_engine() is None:
+        yield None
+        return
+    async with _session_factories["replica"]() as db:
+        yield db
+
+
+def pool_stats(engine: AsyncEngine) -> dict:
+    pool = engine.sync_engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {"pool": type(pool).__name__}
+    capacity = pool.size() + settings.db_max_overflow
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": settings.db_max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "saturation": round(pool.checkedout() / capacity, 3) if capacity else 0.0,
+    }
+
+
+def dialect_insert(db: AsyncSession, table):
+    """Return an INSERT for the session's dialect that supports ON CONFLICT."""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
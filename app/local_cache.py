@@ -0,0 +1,166 @@
+"""Per-worker in-memory (L1) cache in front of the Redis cache keys.
+
+Hot feed entries and profiles are served from process memory as the encoded
+bytes stored in Redis, so a hit costs neither a round trip nor a decode.
+
+Writers bump a global version in Redis and publish it together with the
+invalidated keys in one atomic script, queued on the request's MULTI. Every
+worker subscribes to the channel and drops those keys; the writing worker
+drops them as soon as its MULTI has run, so its next read already misses.
+Because versions are published in order, a worker that sees a gap has missed
+a message and drops everything. While a worker is not subscribed (at startup,
+or after losing its Redis connection) it does not use the L1 cache at all,
+since it would not hear about changes.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from app.cache import TTLCache
+from app.config import settings
+from app.redis_client import redis_client
+
+INVALIDATION_CHANNEL = "Cache: invalidations"
+VERSION_KEY = "Cache: version"
+# Seconds between reconnection attempts of the subscriber.
+RESUBSCRIBE_DELAY = 1.0
+
+PUBLISH_INVALIDATION_SCRIPT = """
+local version = redis.call("incr", KEYS[1])
+redis.call("publish", ARGV[1], version .. "\\n" .. ARGV[2])
+return version
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCache:
+    """Bounded LRU of encoded cache values, kept in sync over pub/sub.
+
+    ``version`` is the last invalidation applied, or None while the worker
+    is not subscribed. Readers take it before going to Redis and pass it to
+    :meth:`set_many`, which discards the values if an invalidation arrived
+    in between, so an old value read just before a write is never kept.
+    """
+
+    def __init__(self, redis_client, maxsize: int, ttl: float):
+        self.redis = redis_client
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.version: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._linked: List[TTLCache] = []
+
+    def link(self, cache: TTLCache):
+        """Apply this cache's invalidations to another cache keyed by Redis
+        keys. Unlike ``entries``, a linked cache stays in use while the
+        worker is not subscribed, so its own TTL bounds what it misses then.
+        """
+        self._linked.append(cache)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        if self.version is None:
+            return {}
+        values = {}
+        for key in keys:
+            value = self.entries.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set_many(self, values: Dict[str, bytes], version: Optional[int]):
+        if version is not None and version == self.version:
+            for key, value in values.items():
+                self.entries.set(key, value)
+
+    def queue_invalidation(self, pipe, keys: List[str]):
+        """Queue the broadcast of ``keys`` on a pipeline, after the writes.
+
+        The keys are evicted locally once the pipeline has run, without
+        waiting for the broadcast to come back.
+        """
+        if not keys:
+            return
+        position = len(pipe)
+        pipe.eval(
+            PUBLISH_INVALIDATION_SCRIPT,
+            1,
+            VERSION_KEY,
+            INVALIDATION_CHANNEL,
+            "\n".join(keys),
+        )
+        pipe.on_execute.append(lambda results: self._evict(results[position], keys))
+
+    def _evict(self, version: int, keys: List[str]):
+        for cache in self._linked:
+            for key in keys:
+                cache.pop(key)
+        if self.version is None:
+            return
+        for key in keys:
+            self.entries.pop(key)
+        # Reads that started before the write must not store what they got.
+        self.version = max(self.version, version)
+
+    def apply(self, message: bytes):
+        version, _, keys = message.decode().partition("\n")
+        version = int(version)
+        if self.version is None:
+            return
+        if version > self.version + 1:
+            logger.warning(
+                f"Missed cache invalidations {self.version + 1}..{version - 1}, "
+                "clearing the local cache"
+            )
+            self.entries.clear()
+            for cache in self._linked:
+                cache.clear()
+            self.version = max(self.version, version)
+        else:
+            self._evict(version, keys.split("\n"))
+
+    def _disable(self):
+        self.version = None
+        self.entries.clear()
+
+    async def _listen(self):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Messages published from here on are queued on the subscription,
+            # so no invalidation after this read can be missed.
+            self.entries.clear()
+            self.version = int(await self.redis.get(VERSION_KEY) or 0)
+            while True:
+                message = await pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    self.apply(message["data"])
+        finally:
+            self._disable()
+            await pubsub.aclose()
+
+    async def listen(self):
+        """Apply invalidations until cancelled, resubscribing after errors."""
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning(f"Local cache disabled, subscription lost: {exc!r}")
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+    def start(self):
+        if self._task is None and self.entries.maxsize > 0:
+            self._task = asyncio.create_task(self.listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+local_cache = LocalCache(
+    redis_client, maxsize=settings.local_cache_size, ttl=settings.local_cache_ttl
+)
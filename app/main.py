@@ -1,22 +1,131 @@
+import asyncio
+import logging
 import os
-
-import uvicorn
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from starlette.responses import HTMLResponse
 
-from app.database import SessionLocal, Base, engine
+from app.config import settings
+from app.database import dispose_engines, get_engine, get_session_factory
+from app.local_cache import local_cache
+from app.media import UploadSizeLimitMiddleware
+from app.metrics import MetricsMiddleware, metrics_response
 from app.models import User
+from app.rate_limit import LoadShedMiddleware
+from app.rebuild import rebuild_scheduler
+from app.redis_client import redis_client
 from app.routes import router
+from app.sweep import upload_sweeper
+
+logger = logging.getLogger(__name__)
+
+
+def configure_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[logging.FileHandler("app.log"), logging.StreamHandler()],
+    )
+
+
+def create_test_user(db: Session, name: str, api_key):
+    user = db.query(User).filter(User.name == name).first()
+
+    if user:
+        return user
+
+    user = User(name=name, api_key=api_key)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def seed_test_users(db: Session):
+    create_test_user(db=db, name="test1", api_key="test")
+    create_test_user(db=db, name="test2", api_key="test2")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    if settings.seed_test_users:
+        async with get_session_factory()() as db:
+            await db.run_sync(seed_test_users)
+    local_cache.start()
+    upload_sweeper.start(get_session_factory())
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    await upload_sweeper.stop()
+    await rebuild_scheduler.drain()
+    await local_cache.stop()
+    await redis_client.close()
+    await dispose_engines()
+
 
 app = FastAPI(
     title="Twitter API",
     version="1.0.0",
     description="API для управления пользователями и твитами",
+    lifespan=lifespan,
 )
 
+app.state.ready = False
+
+app.add_middleware(UploadSizeLimitMiddleware)
+app.add_middleware(LoadShedMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+async def check_database():
+    async with get_engine().connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def check_redis():
+    await redis_client.ping()
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: startup has finished and the database and Redis answer."""
+    if not app.state.ready:
+        return JSONResponse({"status": "starting"}, status_code=503)
+
+    checks = {}
+    for name, check in (("database", check_database), ("redis", check_redis)):
+        try:
+            await asyncio.wait_for(check(), settings.readiness_timeout)
+            checks[name] = "ok"
+        except Exception as exc:
+            logger.warning(f"Readiness check {name} failed: {exc!r}")
+            checks[name] = "error"
+
+    ready = all(status == "ok" for status in checks.values())
+    return JSONResponse(
+        {"status": "ready" if ready else "unavailable", "checks": checks},
+        status_code=200 if ready else 503,
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics of this worker process."""
+    return await metrics_response()
+
+
 app_api = FastAPI()
 
 app_api.include_router(router)
@@ -29,23 +138,6 @@ app.mount(
     name="static",
 )
 
-Base.metadata.create_all(bind=engine)
-
-def create_test_user(db: Session, name: str, api_key):
-    user = db.query(User).filter(User.name == name).first()
-
-    if user:
-        return user
-
-    user = User(name=name, api_key=api_key)
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
-
-db: Session = SessionLocal()
-create_test_user(db=db,name="test1", api_key="test")
-create_test_user(db=db, name="test2", api_key="test2")
 
 @app.get("/", response_class=HTMLResponse)
 def read_root(request: Request):
@@ -53,4 +145,6 @@ def read_root(request: Request):
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
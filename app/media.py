@@ -0,0 +1,287 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import uuid
+from typing import (
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+
+from app.config import settings
+
+# Room for multipart boundaries and part headers on top of the file itself.
+MULTIPART_OVERHEAD = 64 * 1024
+# Blobs are addressed by their hash, so a URL's content never changes.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+logger = logging.getLogger(__name__)
+
+
+class StoredFile(NamedTuple):
+    file_path: str
+    size: int
+    sha256: str
+    # Where the upload waits until publish_upload() moves it to file_path.
+    tmp_path: str
+
+
+def blob_path(sha256: str) -> str:
+    """Return the relative path of a blob, sharded two levels deep so no
+    directory holds more than 256 entries per level."""
+    return os.path.join(sha256[:2], sha256[2:4], sha256)
+
+
+def media_url(media) -> str:
+    if media.sha256:
+        return f"/api/medias/{media.sha256}"
+    # Uploads stored before content addressing live in the static directory.
+    return media.file_path
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=413,
+            detail=f"File exceeds {settings.media_max_upload_size} bytes",
+        )
+
+
+def _copy_to_disk(source: BinaryIO, media_dir: str) -> StoredFile:
+    """Copy ``source`` into a temporary file in the blob store chunk by chunk.
+
+    The file is renamed to its content-addressed path by publish_upload(),
+    so readers never see a partial blob and identical uploads end up in the
+    same file.
+    """
+    os.makedirs(media_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=media_dir, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while True:
+                chunk = source.read(settings.media_chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.media_max_upload_size:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                buffer.write(chunk)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    sha256 = digest.hexdigest()
+    return StoredFile(
+        file_path=blob_path(sha256), size=size, sha256=sha256, tmp_path=tmp_path
+    )
+
+
+async def save_uploaded_file(file: UploadFile) -> StoredFile:
+    if file.size is not None and file.size > settings.media_max_upload_size:
+        raise UploadTooLarge()
+    return await run_in_threadpool(_copy_to_disk, file.file, settings.media_dir)
+
+
+def _publish(stored: StoredFile):
+    path = os.path.join(settings.media_dir, stored.file_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(stored.tmp_path, path)
+
+
+async def publish_upload(stored: StoredFile):
+    """Move an upload to its blob path. Call this only once the blob's row
+    is committed; see :func:`remove_blobs`."""
+    await run_in_threadpool(_publish, stored)
+    logger.info(f"Uploaded file saved at {stored.file_path}")
+
+
+def _discard(stored: StoredFile):
+    try:
+        os.unlink(stored.tmp_path)
+    except FileNotFoundError:
+        pass
+
+
+async def discard_upload(stored: StoredFile):
+    await run_in_threadpool(_discard, stored)
+
+
+def _set_aside(sha256s: List[str]) -> List[Tuple[str, str]]:
+    moved = []
+    for sha256 in sha256s:
+        aside = os.path.join(settings.media_dir, f".removing-{uuid.uuid4().hex}")
+        try:
+            os.replace(os.path.join(settings.media_dir, blob_path(sha256)), aside)
+        except FileNotFoundError:
+            continue
+        moved.append((sha256, aside))
+    return moved
+
+
+def _finish_removal(moved: List[Tuple[str, str]], referenced: Set[str]):
+    for sha256, aside in moved:
+        if sha256 in referenced:
+            os.replace(aside, os.path.join(settings.media_dir, blob_path(sha256)))
+        else:
+            os.unlink(aside)
+
+
+async def remove_blobs(
+    sha256s: List[str], find_referenced: Callable[[List[str]], Awaitable[Set[str]]]
+):
+    """Delete blob files whose last reference is gone.
+
+    An upload of the same content may commit a new row for a blob after its
+    row was deleted. The files are therefore moved aside first and the rows
+    checked again with ``find_referenced``; files referenced by then are put
+    back. Uploads move their file into place only after their row commits,
+    so a file removed here is always either put back or published again.
+    """
+    if not sha256s:
+        return
+    moved = await run_in_threadpool(_set_aside, sha256s)
+    if not moved:
+        return
+    referenced = await find_referenced([sha256 for sha256, _ in moved])
+    await run_in_threadpool(_finish_removal, moved, referenced)
+    logger.info(f"Removed {len(moved) - len(referenced)} unreferenced media blobs")
+
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def _read_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as blob:
+        blob.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = blob.read(min(settings.media_chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _stat_blob(path: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+async def blob_response(
+    sha256: str, content_type: Optional[str], range_header: Optional[str]
+) -> Response:
+    """Serve a blob, honouring a single ``Range: bytes=`` request.
+
+    Whole files go through FileResponse, which hands the path to the server
+    for sendfile when it supports the ``http.response.pathsend`` extension.
+    """
+    path = os.path.join(settings.media_dir, blob_path(sha256))
+    stat_result = await run_in_threadpool(_stat_blob, path)
+    if stat_result is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+
+    media_type = content_type or "application/octet-stream"
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "ETag": f'"{sha256}"',
+    }
+    if not range_header or "," in range_header:
+        return FileResponse(
+            path, media_type=media_type, headers=headers, stat_result=stat_result
+        )
+
+    size = stat_result.st_size
+    byte_range = _parse_range(range_header, size)
+    if byte_range is None:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _read_range(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+class UploadSizeLimitMiddleware:
+    """Reject media uploads over the size limit while they are received.
+
+    A declared Content-Length over the limit is refused before the body is
+    read. Bodies without one (chunked uploads) are counted as they arrive and
+    refused as soon as they pass the limit, before the rest is spooled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not (
+            scope["type"] == "http"
+            and scope["method"] == "POST"
+            and scope["path"].rstrip("/").endswith("/medias")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        limit = settings.media_max_upload_size + MULTIPART_OVERHEAD
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            if not content_length.isdigit():
+                response = JSONResponse(
+                    {"detail": "Invalid Content-Length"}, status_code=400
+                )
+                await response(scope, receive, send)
+                return
+            if int(content_length) > limit:
+                error = UploadTooLarge()
+                response = JSONResponse({"detail": error.detail}, status_code=413)
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the route's body parsing, which turns it
+                    # into the 413 response.
+                    raise UploadTooLarge()
+            return message
+
+        await self.app(scope, limited_receive, send)
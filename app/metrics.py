@@ -0,0 +1,235 @@
+"""Prometheus metrics for the API, the database, Redis and the caches.
+
+Everything recorded here is a counter or histogram update in process memory
+(a lock and a few additions), so collection is cheap enough to stay on in
+production. Gauges that describe pools are read when ``/metrics`` is scraped
+instead of being maintained on every checkout.
+"""
+
+import time
+from collections import Counter as Tally
+from contextvars import ContextVar
+from typing import Callable, Iterable, List, Optional
+
+from anyio import to_thread
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram
+from prometheus_client import generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.responses import Response
+
+from app.database import get_engine, get_replica_engine, pool_stats
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 200)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, by route template.",
+    ["method", "route", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed while handling a request.",
+    ["route"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_QUERY_TIME = Histogram(
+    "http_request_db_query_seconds",
+    "Time spent in SQL statements while handling a request.",
+    ["route"],
+)
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Duration of single SQL statements.",
+    buckets=FAST_BUCKETS,
+)
+QUERY_ERRORS = Counter("db_query_errors_total", "SQL statements that failed.")
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds",
+    "Duration of Redis commands; pipelines are timed as a whole.",
+    ["command"],
+    buckets=FAST_BUCKETS,
+)
+REDIS_CIRCUIT_OPEN = Gauge(
+    "redis_circuit_open", "1 while Redis is skipped after repeated failures."
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Cache lookups by key family and result (local_hit, hit, stale, miss, bypass).",
+    ["family", "result"],
+)
+CACHE_REBUILDS = Counter(
+    "cache_rebuilds_total", "Cache entries recomputed, by key family.", ["family"]
+)
+RATE_LIMITED = Counter(
+    "rate_limited_requests_total",
+    "Requests refused with 429, by route class.",
+    ["route_class"],
+)
+SHED_REQUESTS = Counter(
+    "shed_requests_total", "Write requests refused with 503 under load."
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Pooled database connections by state.",
+    ["engine", "state"],
+)
+DB_POOL_SATURATION = Gauge(
+    "db_pool_saturation",
+    "Checked out connections as a share of pool size plus overflow.",
+    ["engine"],
+)
+THREADPOOL_THREADS = Gauge(
+    "threadpool_threads", "Worker threads for sync code by state.", ["state"]
+)
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_time", "statements", "last_context")
+
+    def __init__(self, keep_statements: bool = False):
+        self.queries = 0
+        self.query_time = 0.0
+        # SQL text is only kept when someone listens for it (see below).
+        self.statements: Optional[List[str]] = [] if keep_statements else None
+        self.last_context = None
+
+
+# Set by MetricsMiddleware for the duration of a request; the engine event
+# handlers below add to it. SQLAlchemy runs them in greenlets that inherit the
+# request's context, so this works for async sessions too.
+current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "current_request", default=None
+)
+
+
+def key_family(key: str) -> str:
+    """``"Tweet: 42"`` -> ``"Tweet"``."""
+    return key.split(":", 1)[0]
+
+
+# Called as ``listener(scope, stats)`` after every HTTP request, with the SQL
+# statements the request ran in ``stats.statements``. Used by the test suite
+# to enforce per-endpoint query budgets; empty in production.
+request_listeners: List[Callable[[dict, RequestStats], None]] = []
+
+
+def record_cache_lookups(result: str, keys: Iterable[str]):
+    for family, count in Tally(map(key_family, keys)).items():
+        CACHE_LOOKUPS.labels(family, result).inc(count)
+
+
+def record_cache_rebuilds(keys: Iterable[str]):
+    for family, count in Tally(map(key_family, keys)).items():
+        CACHE_REBUILDS.labels(family).inc(count)
+
+
+def observe_redis(command: str, seconds: float):
+    REDIS_LATENCY.labels(command).observe(seconds)
+
+
+# Listening on the Engine class covers every engine, including the ones
+# created lazily by app.database and the ones the tests build.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append((statement, time.perf_counter()))
+
+
+def _record_query(conn, statement, context):
+    _, started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    QUERY_LATENCY.observe(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_time += elapsed
+        # One entry per execute() call: SQLite runs an ordered multi-row
+        # INSERT .. RETURNING as one round trip per row with a shared context.
+        if stats.statements is not None and context is not stats.last_context:
+            stats.statements.append(statement)
+            stats.last_context = context
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _record_query(conn, statement, context)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # A failed statement gets no after_cursor_execute; drop its start time
+    # here. Errors raised elsewhere (connecting, fetching rows) have none.
+    conn = exception_context.connection
+    started = conn.info.get("query_started") if conn is not None else None
+    if started and started[-1][0] is exception_context.statement:
+        QUERY_ERRORS.inc()
+        _record_query(
+            conn, exception_context.statement, exception_context.execution_context
+        )
+
+
+def route_label(scope) -> str:
+    """Route template of a handled request, e.g. ``/api/tweets/{tweet_id}``;
+    anything that did not match an API route shares one label."""
+    route = scope.get("route")
+    if route is None:
+        return "other"
+    return scope.get("root_path", "") + route.path
+
+
+class MetricsMiddleware:
+    """Record latency and SQL usage of each HTTP request by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats(keep_statements=bool(request_listeners))
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            route = route_label(scope)
+            REQUEST_LATENCY.labels(scope["method"], route, status).observe(elapsed)
+            REQUEST_QUERIES.labels(route).observe(stats.queries)
+            REQUEST_QUERY_TIME.labels(route).observe(stats.query_time)
+            for listener in request_listeners:
+                listener(scope, stats)
+
+
+def update_pool_gauges():
+    engines = {"primary": get_engine(), "replica": get_replica_engine()}
+    for name, engine in engines.items():
+        if engine is None:
+            continue
+        stats = pool_stats(engine)
+        if "checked_out" not in stats:
+            continue
+        for state in ("checked_out", "checked_in", "overflow"):
+            DB_POOL_CONNECTIONS.labels(name, state).set(stats[state])
+        DB_POOL_SATURATION.labels(name).set(stats["saturation"])
+
+    limiter = to_thread.current_default_thread_limiter()
+    THREADPOOL_THREADS.labels("busy").set(limiter.borrowed_tokens)
+    THREADPOOL_THREADS.labels("limit").set(limiter.total_tokens)
+
+
+async def metrics_response() -> Response:
+    update_pool_gauges()
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
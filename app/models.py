@@ -1,6 +1,21 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, Table, ARRAY
+from datetime import datetime
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    PrimaryKeyConstraint,
+    String,
+    ForeignKey,
+    Text,
+    Table,
+    ARRAY,
+)
 from sqlalchemy.orm import relationship, backref
 from app.database import Base
+from app.search import install_search_index
 
 
 followers = Table(
@@ -8,6 +23,8 @@ followers = Table(
     Base.metadata,
     Column("follower_id", Integer, ForeignKey("users.id")),
     Column("followed_id", Integer, ForeignKey("users.id")),
+    PrimaryKeyConstraint("follower_id", "followed_id"),
+    Index("ix_followers_followed_id", "followed_id", "follower_id"),
 )
 
 likes = Table(
@@ -15,6 +32,8 @@ likes = Table(
     Base.metadata,
     Column("user_id", Integer, ForeignKey("users.id")),
     Column("tweet_id", Integer, ForeignKey("tweets.id")),
+    PrimaryKeyConstraint("tweet_id", "user_id"),
+    Index("ix_likes_user_id", "user_id", "tweet_id"),
 )
 
 
@@ -23,6 +42,8 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     api_key = Column(String, unique=True, index=True)
+    follower_count = Column(Integer, nullable=False, default=0, server_default="0")
+    following_count = Column(Integer, nullable=False, default=0, server_default="0")
     tweets = relationship("Tweet", back_populates="author")
     followed = relationship(
         "User",
@@ -38,20 +59,41 @@ class User(Base):
 class Tweet(Base):
     __tablename__ = "tweets"
     id = Column(Integer, primary_key=True, index=True)
-    tweet_data = Column(Text, index=True)
+    tweet_data = Column(Text)
     author_id = Column(Integer, ForeignKey("users.id"))
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
     author = relationship("User", back_populates="tweets")
     liked_by = relationship("User", secondary=likes, back_populates="likes")
     media = relationship("Media", back_populates="tweet", cascade="all, delete-orphan")
 
+    __table_args__ = (Index("ix_tweets_author_id_id", "author_id", "id"),)
+
+
+install_search_index(Tweet.__table__)
+
 
 class Media(Base):
     __tablename__ = "media"
     id = Column(Integer, primary_key=True, index=True)
     file_path = Column(String, index=True)
+    size = Column(BigInteger)
+    sha256 = Column(String(64), index=True)
     tweet_id = Column(Integer, ForeignKey("tweets.id"))
+    # Uploads still unattached media_unattached_ttl seconds after this are
+    # deleted by the upload sweeper.
+    uploaded_at = Column(DateTime, default=datetime.utcnow, index=True)
     tweet = relationship("Tweet", back_populates="media")
 
 
+class MediaBlob(Base):
+    """A stored file, shared by every Media row with the same content."""
+
+    __tablename__ = "media_blobs"
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String)
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+
 
 # tweet_media_ids = Column(ARRAY(Integer), default=None)
\ No newline at end of file
@@ -0,0 +1,90 @@
+import base64
+import binascii
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Query
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def _encode(value: str) -> str:
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> str:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.urlsafe_b64decode(padded.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_cursor(last_id: int) -> str:
+    return _encode(str(last_id))
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    if not cursor:
+        return None
+    try:
+        return int(_decode(cursor))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_ranked_cursor(score: float, last_id: int) -> str:
+    return _encode(f"{score!r}:{last_id}")
+
+
+def decode_ranked_cursor(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+    if not cursor:
+        return None
+    try:
+        score, last_id = _decode(cursor).split(":")
+        return float(score), int(last_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class Page:
+    """Keyset pagination parameters: ``?cursor=<opaque>&limit=N``.
+
+    The cursor encodes the last ID of the previous page, so every page is an
+    indexed ``WHERE id < :cursor ORDER BY id DESC LIMIT :limit`` lookup.
+    """
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1),
+    ):
+        self.before_id = decode_cursor(cursor)
+        self.limit = min(limit, MAX_PAGE_SIZE)
+
+    def next_cursor(self, ids: List[int]) -> Optional[str]:
+        if len(ids) < self.limit:
+            return None
+        return encode_cursor(ids[-1])
+
+
+class RankedPage:
+    """Keyset pagination over results ordered by ``(score DESC, id DESC)``.
+
+    The cursor carries the score and ID of the last result, so the next page
+    continues strictly after it even when several results share a score.
+    """
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1),
+    ):
+        self.after = decode_ranked_cursor(cursor)
+        self.limit = min(limit, MAX_PAGE_SIZE)
+
+    def next_cursor(self, results: List[Tuple[int, float]]) -> Optional[str]:
+        if len(results) < self.limit:
+            return None
+        last_id, score = results[-1]
+        return encode_ranked_cursor(score, last_id)
@@ -0,0 +1,136 @@
+"""Per API key rate limits and load shedding for write requests.
+
+Every route belongs to a route class (see ``ROUTE_CLASSES``) with its own
+token bucket per API key: ``rate`` tokens per second are added up to
+``burst``, and each request takes one. Buckets live in Redis and are updated
+by a single Lua script, so all workers share them and concurrent requests
+cannot both take the last token. Requests over the limit get 429 with a
+Retry-After header before authentication or any database work.
+
+Separately, :class:`LoadShedMiddleware` caps the writes one worker handles
+at once and answers the rest with 503 straight away, so a burst of writes
+queues in front of the app instead of on the database pool.
+"""
+
+import hashlib
+import logging
+import math
+from functools import cached_property
+
+from fastapi import Header, HTTPException
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+from app.metrics import RATE_LIMITED, SHED_REQUESTS
+from app.redis_client import REDIS_FAILURES, redis_client
+
+logger = logging.getLogger(__name__)
+
+ROUTE_CLASSES = ("read", "write", "engagement")
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# Returns {1, 0} if a token was taken, otherwise {0, seconds until one is
+# available}; the wait is returned as a string since Lua numbers are
+# truncated to integers on the way out. Redis' clock is used so that workers
+# with skewed clocks agree on the bucket.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call("time")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call("hmget", KEYS[1], "tokens", "updated_at")
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+local allowed, wait = 0, 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call("hset", KEYS[1], "tokens", tokens, "updated_at", now)
+redis.call("expire", KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+
+def bucket_key(route_class: str, api_key: str) -> str:
+    # Like Auth keys, only a digest of the credential is written to Redis.
+    digest = hashlib.sha256(api_key.encode()).hexdigest()
+    return f"RateLimit: {route_class}: {digest}"
+
+
+class RateLimit:
+    """Dependency enforcing the limit of one route class.
+
+    Limits come from ``rate_limit_<class>_rate`` and ``..._burst`` settings;
+    a rate of 0 turns the class off. When Redis is unavailable requests are
+    let through, since refusing everybody would be worse than no limit.
+    """
+
+    def __init__(self, route_class: str):
+        if route_class not in ROUTE_CLASSES:
+            raise ValueError(f"Unknown route class: {route_class}")
+        self.route_class = route_class
+
+    @cached_property
+    def _take_token(self):
+        return redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def __call__(self, api_key: str = Header(...)):
+        rate = getattr(settings, f"rate_limit_{self.route_class}_rate")
+        burst = getattr(settings, f"rate_limit_{self.route_class}_burst")
+        if rate <= 0:
+            return
+        try:
+            allowed, wait = await self._take_token(
+                keys=[bucket_key(self.route_class, api_key)], args=[rate, burst]
+            )
+        except REDIS_FAILURES as exc:
+            logger.warning(f"Rate limit not checked, Redis unavailable: {exc!r}")
+            return
+        if not allowed:
+            RATE_LIMITED.labels(self.route_class).inc()
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(float(wait)))},
+            )
+
+
+rate_limit_reads = RateLimit("read")
+rate_limit_writes = RateLimit("write")
+rate_limit_engagement = RateLimit("engagement")
+
+
+class LoadShedMiddleware:
+    """Answer write requests with 503 while ``max_concurrent_writes`` of them
+    are already being handled by this worker."""
+
+    def __init__(self, app):
+        self.app = app
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        limit = settings.max_concurrent_writes
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS or not limit:
+            await self.app(scope, receive, send)
+            return
+
+        if self.in_flight >= limit:
+            SHED_REQUESTS.inc()
+            response = JSONResponse(
+                {"detail": "Server is busy, try again later"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
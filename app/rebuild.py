@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import uuid
+from functools import cached_property
+from typing import List, Set
+
+from app.cache import RELEASE_LOCK_SCRIPT, lock_key
+from app.config import settings
+from app.metrics import record_cache_rebuilds
+from app.redis_client import REDIS_FAILURES, redis_client
+from app.repository.tweet_cache_repository import TweetCacheRepository, tweet_key
+
+logger = logging.getLogger(__name__)
+
+
+def pending_key(tweet_id: int) -> str:
+    return f"Rebuild: Tweet: {tweet_id}"
+
+
+class RebuildScheduler:
+    """Debounces refreshes of cached feed entries across all workers.
+
+    The first invalidation of a tweet sets a pending marker in Redis and
+    schedules one background refresh ``feed_rebuild_delay`` seconds later;
+    invalidations that find the marker already set are absorbed by that
+    refresh. The refresh itself runs under a per-tweet Redis lock so that at
+    most one worker rebuilds a given entry at a time.
+
+    Scheduling also caps the entry's remaining lifetime at
+    ``feed_rebuild_max_staleness`` seconds; the refresh stores it again with
+    its full TTL. If the refresh fails or its worker goes away, the entry
+    expires and is rebuilt on the next read instead.
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._tasks: Set[asyncio.Task] = set()
+
+    @cached_property
+    def _release_lock(self):
+        return self.redis.register_script(RELEASE_LOCK_SCRIPT)
+
+    async def schedule(self, tweet_id: int, session_factory):
+        await self.schedule_many([tweet_id], session_factory)
+
+    async def schedule_many(self, tweet_ids: List[int], session_factory):
+        """Schedule refreshes of several entries with one round trip."""
+        if not tweet_ids:
+            return
+        ttl = settings.feed_rebuild_delay + settings.feed_rebuild_lock_timeout
+        pipe = self.redis.pipeline(transaction=False)
+        for tweet_id in tweet_ids:
+            pipe.set(pending_key(tweet_id), 1, nx=True, px=int(ttl * 1000))
+            pipe.expire(
+                tweet_key(tweet_id), settings.feed_rebuild_max_staleness, lt=True
+            )
+        try:
+            results = await pipe.execute()
+        except REDIS_FAILURES as exc:
+            # The cached entries stay as they are until their soft TTL runs out.
+            logger.warning(f"Tweet cache refresh skipped for {tweet_ids}: {exc!r}")
+            return
+        for tweet_id, scheduled in zip(tweet_ids, results[::2]):
+            if not scheduled:
+                continue
+            task = asyncio.create_task(self._run(tweet_id, session_factory))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, tweet_id: int, session_factory):
+        key = lock_key(tweet_key(tweet_id))
+        token = uuid.uuid4().hex
+        locked = False
+        try:
+            await asyncio.sleep(settings.feed_rebuild_delay)
+            while not await self.redis.set(
+                key, token, nx=True, ex=settings.feed_rebuild_lock_timeout
+            ):
+                await asyncio.sleep(max(settings.feed_rebuild_delay, 0.05))
+            locked = True
+            # Clear the marker before reading so that later writes schedule
+            # another refresh instead of being lost.
+            await self.redis.delete(pending_key(tweet_id))
+            async with session_factory() as db:
+                await TweetCacheRepository(db, self.redis).refresh(tweet_id)
+            record_cache_rebuilds([tweet_key(tweet_id)])
+            logger.info(f"Tweet cache rebuilt with key: Tweet: {tweet_id}")
+        except Exception:
+            logger.exception(f"Failed to rebuild tweet cache for tweet ID: {tweet_id}")
+            # Let the next write schedule a refresh; until then the entry
+            # expires within feed_rebuild_max_staleness.
+            await self._ignore_redis_failures(self.redis.delete(pending_key(tweet_id)))
+        finally:
+            if locked:
+                await self._ignore_redis_failures(
+                    self._release_lock(keys=[key], args=[token])
+                )
+
+    async def _ignore_redis_failures(self, command):
+        try:
+            await command
+        except REDIS_FAILURES as exc:
+            logger.warning(f"Tweet cache refresh cleanup failed: {exc!r}")
+
+    async def drain(self):
+        """Wait for the refreshes scheduled by this worker to finish."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+rebuild_scheduler = RebuildScheduler(redis_client)
@@ -0,0 +1,200 @@
+import logging
+import time
+from typing import Optional
+
+from redis import asyncio as redis
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from app.config import settings
+from app.metrics import REDIS_CIRCUIT_OPEN, observe_redis
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean Redis is unreachable or too slow, as opposed to a bad
+# command. Callers that can serve a request without Redis catch these.
+REDIS_FAILURES = (RedisConnectionError, RedisTimeoutError)
+
+
+class RedisUnavailable(RedisConnectionError):
+    """Raised without contacting Redis while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stops sending commands to Redis after repeated failures.
+
+    After ``failure_threshold`` consecutive connection errors or timeouts the
+    breaker opens and every command fails at once with
+    :class:`RedisUnavailable` for ``reset_timeout`` seconds, so a dead or
+    overloaded Redis costs requests nothing instead of a timeout each. Then a
+    single command is let through as a trial; its outcome closes the breaker
+    or opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_call(self):
+        if self.opened_at is None:
+            return
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            raise RedisUnavailable("Redis circuit breaker is open")
+        # Let this call through as the trial and keep everybody else out
+        # until it finishes.
+        self.opened_at = time.monotonic()
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("Redis is reachable again, closing the circuit breaker")
+            REDIS_CIRCUIT_OPEN.set(0)
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(
+                    f"Redis failed {self.failures} times in a row, skipping it "
+                    f"for {self.reset_timeout}s"
+                )
+                REDIS_CIRCUIT_OPEN.set(1)
+            self.opened_at = time.monotonic()
+
+
+class InstrumentedRedis(redis.StrictRedis):
+    """Client that records the latency of every command and pipeline and
+    reports their outcome to a circuit breaker."""
+
+    def __init__(self, *args, breaker: Optional[CircuitBreaker] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker or CircuitBreaker(
+            settings.redis_breaker_failures, settings.redis_breaker_reset
+        )
+
+    async def _guarded(self, name: str, call):
+        self.breaker.before_call()
+        started = time.perf_counter()
+        try:
+            result = await call()
+        except REDIS_FAILURES:
+            self.breaker.record_failure()
+            raise
+        finally:
+            observe_redis(name, time.perf_counter() - started)
+        self.breaker.record_success()
+        return result
+
+    async def execute_command(self, *args, **options):
+        parent = super()
+        return await self._guarded(
+            str(args[0]).upper(), lambda: parent.execute_command(*args, **options)
+        )
+
+    def pipeline(self, *args, **kwargs):
+        pipe = super().pipeline(*args, **kwargs)
+        execute = pipe.execute
+        # Callbacks given the results once the queued commands have run.
+        pipe.on_execute = []
+
+        async def guarded_execute(*execute_args, **execute_kwargs):
+            callbacks, pipe.on_execute = pipe.on_execute, []
+            results = await self._guarded(
+                "PIPELINE", lambda: execute(*execute_args, **execute_kwargs)
+            )
+            for callback in callbacks:
+                callback(results)
+            return results
+
+        pipe.execute = guarded_execute
+        return pipe
+
+
+class LazyRedis:
+    """Redis client that is created on first use.
+
+    Importing the app must not need a reachable (or even resolvable) Redis
+    host, so the pool and client are built the first time a command is sent.
+    Attribute access is forwarded to the real client.
+
+    The pool is bounded and every command has a timeout, so a slow Redis
+    cannot hold on to workers; retries are left to the circuit breaker.
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._client = None
+        self.breaker = CircuitBreaker(
+            settings.redis_breaker_failures, settings.redis_breaker_reset
+        )
+
+    def _get_client(self):
+        if self._client is None:
+            self._pool = redis.BlockingConnectionPool(
+                host=settings.redis_host,
+                port=settings.redis_port,
+                max_connections=settings.redis_max_connections,
+                timeout=settings.redis_pool_timeout,
+                socket_timeout=settings.redis_socket_timeout,
+                socket_connect_timeout=settings.redis_connect_timeout,
+                health_check_interval=settings.redis_health_check_interval,
+                retry=Retry(NoBackoff(), 0),
+            )
+            self._client = InstrumentedRedis(
+                connection_pool=self._pool, breaker=self.breaker
+            )
+        return self._client
+
+    def use_pool(self, pool):
+        """Send commands through ``pool`` instead of the configured server,
+        e.g. a pool of fakeredis connections in benchmarks."""
+        self._pool = pool
+        self._client = InstrumentedRedis(connection_pool=pool, breaker=self.breaker)
+
+    def __getattr__(self, name):
+        return getattr(self._get_client(), name)
+
+    async def close(self):
+        """Close pooled connections; they are reopened on the next command."""
+        if self._pool is not None:
+            await self._pool.disconnect()
+
+
+redis_client = LazyRedis()
+
+
+async def send_cache_writes(pipe):
+    """Send the commands queued on ``pipe``. Cache writes are best effort:
+    when Redis is unavailable they are logged and dropped, and the affected
+    entries catch up when they expire or are rebuilt."""
+    count = len(pipe)
+    if not count:
+        return
+    try:
+        await pipe.execute()
+    except REDIS_FAILURES as exc:
+        logger.warning(f"Dropped {count} cache writes: {exc!r}")
+
+
+async def get_cache_writes():
+    """Pipeline for the Redis writes of one request.
+
+    Invalidations queued on it during the request are sent as one MULTI/EXEC
+    when the route returns, before the response goes out, so the client's
+    next request already sees them. Timeline fan-out, which can touch
+    thousands of keys, is not queued here but sent in chunks of its own.
+    """
+    pipe = redis_client.pipeline(transaction=True)
+    try:
+        yield pipe
+    finally:
+        await send_cache_writes(pipe)
@@ -0,0 +1,62 @@
+"""Routing of read-only requests between the primary and the replica.
+
+GET routes take their session from :func:`get_read_db`, routes that write
+from :func:`get_write_db`. A write marks its user in Redis for
+``read_your_writes_window`` seconds, and that user's reads stay on the
+primary meanwhile, so replication lag never hides their own changes.
+
+Anything written to a shared cache (Redis or the per-worker L1) is read from
+the primary instead, whatever the route: a value read from a lagging replica
+right after a write invalidated it would be cached for every user until it
+expires. Replica sessions only serve results that are returned uncached.
+"""
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import schemas
+from app.auth import get_current_user
+from app.config import settings
+from app.database import get_db, get_replica_db
+from app.redis_client import REDIS_FAILURES, get_cache_writes, redis_client
+
+
+def recent_write_key(user_id: int) -> str:
+    return f"Wrote: {user_id}"
+
+
+def _read_your_writes(replica) -> bool:
+    return replica is not None and settings.read_your_writes_window > 0
+
+
+async def get_write_db(
+    user: schemas.CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    replica=Depends(get_replica_db),
+    writes=Depends(get_cache_writes),
+) -> AsyncSession:
+    if _read_your_writes(replica):
+        # Sent with the request's other cache writes, before the response.
+        writes.set(
+            recent_write_key(user.id),
+            1,
+            px=int(settings.read_your_writes_window * 1000),
+        )
+    return db
+
+
+async def get_read_db(
+    user: schemas.CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    replica=Depends(get_replica_db),
+) -> AsyncSession:
+    if replica is None:
+        return db
+    if not _read_your_writes(replica):
+        return replica
+    try:
+        wrote_recently = await redis_client.exists(recent_write_key(user.id))
+    except REDIS_FAILURES:
+        # Without the markers, the primary is the only safe choice.
+        return db
+    return db if wrote_recently else replica
@@ -1,14 +1,91 @@
-from sqlalchemy.orm import Session
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional, Set
+
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from app import models
+from app.database import dialect_insert
 
 
 class MediaRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def upload_media(self, file_path: str) -> models.Media:
-        media = models.Media(file_path=file_path)
+    async def upload_media(
+        self,
+        file_path: str,
+        size: int,
+        sha256: str,
+        content_type: Optional[str] = None,
+    ) -> models.Media:
+        blobs = models.MediaBlob.__table__
+        insert = dialect_insert(self.db, blobs).values(
+            sha256=sha256, size=size, content_type=content_type, ref_count=1
+        )
+        await self.db.execute(
+            insert.on_conflict_do_update(
+                index_elements=[blobs.c.sha256],
+                set_={"ref_count": blobs.c.ref_count + 1},
+            )
+        )
+        media = models.Media(file_path=file_path, size=size, sha256=sha256)
         self.db.add(media)
-        self.db.commit()
-        self.db.refresh(media)
+        await self.db.commit()
+        await self.db.refresh(media)
         return media
+
+    async def get_blob(self, sha256: str) -> Optional[models.MediaBlob]:
+        return await self.db.get(models.MediaBlob, sha256)
+
+    async def get_existing_blobs(self, sha256s: List[str]) -> Set[str]:
+        if not sha256s:
+            return set()
+        rows = await self.db.scalars(
+            select(models.MediaBlob.sha256).where(models.MediaBlob.sha256.in_(sha256s))
+        )
+        return set(rows.all())
+
+    async def release_blobs(self, sha256s: List[str]) -> List[str]:
+        """Drop one reference per hash and return the blobs left unreferenced.
+
+        Runs inside the caller's transaction; the returned files should only
+        be removed after it commits.
+        """
+        if not sha256s:
+            return []
+        counts = Counter(sha256s)
+        await self.db.execute(
+            update(models.MediaBlob)
+            .where(models.MediaBlob.sha256.in_(list(counts)))
+            .values(
+                ref_count=models.MediaBlob.ref_count
+                - case(counts, value=models.MediaBlob.sha256)
+            )
+        )
+        orphaned = await self.db.execute(
+            delete(models.MediaBlob)
+            .where(
+                models.MediaBlob.sha256.in_(list(counts)),
+                models.MediaBlob.ref_count <= 0,
+            )
+            .returning(models.MediaBlob.sha256)
+        )
+        return [row.sha256 for row in orphaned]
+
+    async def delete_unattached(self, uploaded_before: datetime) -> List[str]:
+        """Delete uploads never attached to a tweet and release their blobs.
+
+        Returns the blobs left unreferenced, as :meth:`release_blobs` does.
+        """
+        media_hashes = await self.db.scalars(
+            delete(models.Media)
+            .where(
+                models.Media.tweet_id.is_(None),
+                models.Media.uploaded_at < uploaded_before,
+            )
+            .returning(models.Media.sha256)
+        )
+        return await self.release_blobs(
+            [sha256 for sha256 in media_hashes if sha256 is not None]
+        )
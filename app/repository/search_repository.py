@@ -0,0 +1,80 @@
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.search import FTS_TABLE, SEARCH_CONFIG, SEARCH_VECTOR_COLUMN
+
+# Only the newest matches of a query are ranked, which bounds the work done
+# for very common terms.
+SEARCH_MAX_CANDIDATES = 10000
+
+WORD_PATTERN = re.compile(r"\w+")
+
+POSTGRES_SEARCH = text(f"""
+    SELECT id, score FROM (
+        SELECT id, ts_rank({SEARCH_VECTOR_COLUMN}, query) AS score
+        FROM (
+            SELECT id, {SEARCH_VECTOR_COLUMN} FROM tweets
+            WHERE {SEARCH_VECTOR_COLUMN} @@ plainto_tsquery('{SEARCH_CONFIG}', :terms)
+            ORDER BY id DESC
+            LIMIT :candidates
+        ) AS candidates, plainto_tsquery('{SEARCH_CONFIG}', :terms) AS query
+    ) AS ranked
+    WHERE CAST(:score AS double precision) IS NULL
+        OR (score, id) < (CAST(:score AS double precision), :last_id)
+    ORDER BY score DESC, id DESC
+    LIMIT :limit
+    """)
+
+SQLITE_SEARCH = text(f"""
+    SELECT id, score FROM (
+        SELECT rowid AS id, -bm25({FTS_TABLE}) AS score
+        FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH :terms
+        ORDER BY rowid DESC
+        LIMIT :candidates
+    )
+    WHERE :score IS NULL OR score < :score OR (score = :score AND id < :last_id)
+    ORDER BY score DESC, id DESC
+    LIMIT :limit
+    """)
+
+
+def search_terms(query: str) -> List[str]:
+    return WORD_PATTERN.findall(query.lower())
+
+
+class SearchRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def search_tweet_ids(
+        self, query: str, limit: int, after: Optional[Tuple[float, int]] = None
+    ) -> List[Tuple[int, float]]:
+        """Return ``(tweet_id, score)`` pairs for tweets containing every word
+        of ``query``, best match first; ``after`` is the score and ID of the
+        last result of the previous page."""
+        terms = search_terms(query)
+        if not terms:
+            return []
+
+        if self.db.get_bind().dialect.name == "postgresql":
+            statement, terms = POSTGRES_SEARCH, " ".join(terms)
+        else:
+            # Quoted FTS5 strings, so user input is never parsed as operators.
+            statement, terms = SQLITE_SEARCH, " ".join(f'"{term}"' for term in terms)
+
+        score, last_id = after if after else (None, None)
+        rows = await self.db.execute(
+            statement,
+            {
+                "terms": terms,
+                "candidates": SEARCH_MAX_CANDIDATES,
+                "score": score,
+                "last_id": last_id,
+                "limit": limit,
+            },
+        )
+        return [(row.id, row.score) for row in rows]
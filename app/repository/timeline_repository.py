@@ -0,0 +1,273 @@
+import logging
+from typing import List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.metrics import CACHE_LOOKUPS, CACHE_REBUILDS
+from app.redis_client import REDIS_FAILURES, send_cache_writes
+from app.repository.tweet_repository import TweetRepository
+from app.repository.user_repository import UserRepository
+
+# Number of tweet IDs kept in each home timeline.
+TIMELINE_MAX_LENGTH = 800
+# Timelines of users who stop reading expire and are rebuilt on their next visit.
+TIMELINE_TTL = 60 * 60 * 24 * 7
+# Authors with more followers than this are not fanned out on write; their
+# tweets are merged into followers' timelines when the timeline is read.
+FANOUT_FOLLOWER_LIMIT = 10000
+# Tweet IDs written per pipeline when timelines are updated. Fan-out is sent
+# in chunks outside the request's MULTI, so a big batch never blocks Redis
+# or runs into the socket timeout as one command.
+TIMELINE_CHUNK_MEMBERS = 10000
+
+CELEBRITIES_KEY = "Timeline: celebrities"
+
+# Trims a timeline to ARGV[1] entries and, if that evicted anything, marks it
+# as trimmed for ARGV[2] seconds: older tweets then exist only in the database.
+TRIM_SCRIPT = """
+if redis.call("zremrangebyrank", KEYS[1], 0, -tonumber(ARGV[1]) - 1) > 0 then
+    redis.call("set", KEYS[2], 1, "ex", ARGV[2])
+end
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def timeline_key(user_id: int) -> str:
+    return f"Timeline: {user_id}"
+
+
+def trimmed_key(user_id: int) -> str:
+    return f"Trimmed: Timeline: {user_id}"
+
+
+class TimelineRepository:
+    """Per-user home timelines stored as Redis sorted sets of tweet IDs."""
+
+    def __init__(self, db: AsyncSession, redis_client, writes=None):
+        self.db = db
+        self.redis = redis_client
+        # The request's write pipeline; celebrity set updates are queued on
+        # it, timeline contents are written separately in chunks.
+        self.writes = writes
+        self.user_repo = UserRepository(db)
+        self.tweet_repo = TweetRepository(db)
+
+    def _write_pipeline(self):
+        if self.writes is not None:
+            return self.writes
+        return self.redis.pipeline(transaction=False)
+
+    async def _send(self, pipe):
+        # The request's pipeline is sent once, when the request finishes.
+        if pipe is not self.writes:
+            await pipe.execute()
+
+    async def _existing_timelines(self, user_ids: List[int]) -> List[int]:
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.exists(timeline_key(user_id))
+        try:
+            results = await pipe.execute()
+        except REDIS_FAILURES as exc:
+            # Without Redis there is nothing to update; timelines that miss
+            # this change catch up when they expire and are rebuilt.
+            logger.warning(f"Timeline update skipped, Redis unavailable: {exc!r}")
+            return []
+        return [user_id for user_id, exists in zip(user_ids, results) if exists]
+
+    async def _update_timelines(self, user_ids: List[int], queue, members: int = 1):
+        """Call ``queue(pipe, user_id)`` for each timeline, sending the commands
+        in non-transactional chunks of about ``TIMELINE_CHUNK_MEMBERS`` when
+        each touches ``members`` tweet IDs."""
+        per_chunk = max(1, TIMELINE_CHUNK_MEMBERS // members)
+        for start in range(0, len(user_ids), per_chunk):
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id in user_ids[start : start + per_chunk]:
+                queue(pipe, user_id)
+            await send_cache_writes(pipe)
+
+    async def _push(self, user_ids: List[int], tweet_ids: List[int]):
+        if not user_ids or not tweet_ids:
+            return
+        members = {tweet_id: tweet_id for tweet_id in tweet_ids}
+
+        def queue(pipe, user_id):
+            key = timeline_key(user_id)
+            pipe.zadd(key, members)
+            pipe.eval(
+                TRIM_SCRIPT,
+                2,
+                key,
+                trimmed_key(user_id),
+                TIMELINE_MAX_LENGTH,
+                TIMELINE_TTL,
+            )
+
+        await self._update_timelines(user_ids, queue, len(tweet_ids))
+
+    async def _pull(self, user_ids: List[int], tweet_ids: List[int]):
+        if not user_ids or not tweet_ids:
+            return
+
+        def queue(pipe, user_id):
+            pipe.zrem(timeline_key(user_id), *tweet_ids)
+
+        await self._update_timelines(user_ids, queue, len(tweet_ids))
+
+    async def _invalidate(self, user_ids: List[int]):
+        def queue(pipe, user_id):
+            pipe.delete(timeline_key(user_id), trimmed_key(user_id))
+
+        await self._update_timelines(user_ids, queue)
+
+    async def _fanout_targets(self, author_id: int) -> List[int]:
+        """Return the author plus their followers, or only the author if they
+        have too many followers to be fanned out on write."""
+        if await self.user_repo.count_followers(author_id) > FANOUT_FOLLOWER_LIMIT:
+            pipe = self._write_pipeline()
+            pipe.sadd(CELEBRITIES_KEY, author_id)
+            await self._send(pipe)
+            return [author_id]
+        follower_ids = await self.user_repo.get_follower_ids(author_id)
+        try:
+            was_celebrity = await self.redis.srem(CELEBRITIES_KEY, author_id)
+        except REDIS_FAILURES as exc:
+            logger.warning(f"Fan-out skipped, Redis unavailable: {exc!r}")
+            return []
+        if was_celebrity:
+            # Their tweets were merged in on read and are missing from the
+            # followers' cached timelines, which are rebuilt on next read.
+            await self._invalidate(follower_ids)
+        return [author_id] + follower_ids
+
+    async def fan_out_tweet(self, tweet_id: int, author_id: int):
+        """Push a new tweet into the cached timelines of the author's audience.
+
+        Timelines that are not cached are skipped: they are rebuilt from the
+        database when their owner next reads them.
+        """
+        await self.fan_out_tweets([tweet_id], author_id)
+
+    async def fan_out_tweets(self, tweet_ids: List[int], author_id: int):
+        targets = await self._existing_timelines(await self._fanout_targets(author_id))
+        await self._push(targets, tweet_ids)
+
+    async def remove_tweet(self, tweet_id: int, author_id: int):
+        await self._pull(await self._fanout_targets(author_id), [tweet_id])
+
+    async def add_author(self, user_id: int, author_id: int):
+        await self.add_authors(user_id, [author_id])
+
+    async def add_authors(self, user_id: int, author_ids: List[int]):
+        """Backfill newly followed authors' recent tweets."""
+        if author_ids and await self._existing_timelines([user_id]):
+            tweet_ids = await self.tweet_repo.get_recent_tweet_ids(
+                author_ids, TIMELINE_MAX_LENGTH
+            )
+            await self._push([user_id], tweet_ids)
+
+    async def remove_author(self, user_id: int, author_id: int):
+        await self.remove_authors(user_id, [author_id])
+
+    async def remove_authors(self, user_id: int, author_ids: List[int]):
+        if author_ids:
+            tweet_ids = await self.tweet_repo.get_recent_tweet_ids(
+                author_ids, TIMELINE_MAX_LENGTH
+            )
+            await self._pull([user_id], tweet_ids)
+
+    async def _rebuild(self, user_id: int, followed_ids: List[int]) -> List[int]:
+        tweet_ids = await self.tweet_repo.get_recent_tweet_ids(
+            [user_id] + followed_ids, TIMELINE_MAX_LENGTH
+        )
+        if tweet_ids:
+            pipe = self.redis.pipeline()
+            pipe.zadd(
+                timeline_key(user_id), {tweet_id: tweet_id for tweet_id in tweet_ids}
+            )
+            pipe.expire(timeline_key(user_id), TIMELINE_TTL)
+            if len(tweet_ids) >= TIMELINE_MAX_LENGTH:
+                pipe.set(trimmed_key(user_id), 1, ex=TIMELINE_TTL)
+            else:
+                pipe.delete(trimmed_key(user_id))
+            await pipe.execute()
+        return tweet_ids
+
+    async def get_timeline(
+        self, user_id: int, limit: int, before_id: Optional[int] = None
+    ) -> List[int]:
+        """Return up to ``limit`` tweet IDs of a user's home timeline older than
+        ``before_id``, newest first. Without Redis the timeline is read from
+        the database."""
+        try:
+            return await self._get_cached_timeline(user_id, limit, before_id)
+        except REDIS_FAILURES as exc:
+            logger.warning(
+                f"Timeline read from the database, Redis unavailable: {exc!r}"
+            )
+            CACHE_LOOKUPS.labels("Timeline", "bypass").inc()
+            followed_ids = await self.user_repo.get_followed_ids(user_id)
+            return await self.tweet_repo.get_recent_tweet_ids(
+                [user_id] + followed_ids, limit, before_id
+            )
+
+    async def _get_cached_timeline(
+        self, user_id: int, limit: int, before_id: Optional[int]
+    ) -> List[int]:
+        # The full list of followed IDs is only loaded when the timeline has
+        # to be read from the database.
+        followed_ids = None
+        key = timeline_key(user_id)
+        max_score = f"({before_id}" if before_id is not None else "+inf"
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zrevrangebyscore(key, max_score, "-inf", start=0, num=limit)
+        pipe.expire(key, TIMELINE_TTL)
+        pipe.expire(trimmed_key(user_id), TIMELINE_TTL)
+        pipe.smembers(CELEBRITIES_KEY)
+        cached_ids, exists, trimmed, celebrity_ids = await pipe.execute()
+
+        if exists:
+            CACHE_LOOKUPS.labels("Timeline", "hit").inc()
+            tweet_ids = [int(tweet_id) for tweet_id in cached_ids]
+        else:
+            CACHE_LOOKUPS.labels("Timeline", "miss").inc()
+            CACHE_REBUILDS.labels("Timeline").inc()
+            followed_ids = await self.user_repo.get_followed_ids(user_id)
+            rebuilt = await self._rebuild(user_id, followed_ids)
+            tweet_ids = [
+                tweet_id
+                for tweet_id in rebuilt
+                if before_id is None or tweet_id < before_id
+            ][:limit]
+            trimmed = len(rebuilt) >= TIMELINE_MAX_LENGTH
+
+        if len(tweet_ids) < limit and trimmed:
+            # Paging past the end of a timeline that lost older tweets to
+            # trimming falls back to the (author_id, id) lookup in the
+            # database. Its size is no guide, since deletes shrink it too.
+            if followed_ids is None:
+                followed_ids = await self.user_repo.get_followed_ids(user_id)
+            tweet_ids = await self.tweet_repo.get_recent_tweet_ids(
+                [user_id] + followed_ids, limit, before_id
+            )
+
+        celebrity_ids = [int(celebrity_id) for celebrity_id in celebrity_ids]
+        if not celebrity_ids:
+            return tweet_ids
+        if followed_ids is None:
+            followed_celebrities = await self.user_repo.get_followed_ids(
+                user_id, among=celebrity_ids
+            )
+        else:
+            followed_celebrities = list(set(celebrity_ids) & set(followed_ids))
+        if followed_celebrities:
+            tweet_ids = set(tweet_ids) | set(
+                await self.tweet_repo.get_recent_tweet_ids(
+                    followed_celebrities, limit, before_id
+                )
+            )
+            tweet_ids = sorted(tweet_ids, reverse=True)[:limit]
+
+        return tweet_ids
@@ -0,0 +1,88 @@
+from typing import Dict, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import codec
+from app.cache import StaleWhileRevalidateCache
+from app.local_cache import local_cache
+from app.repository.tweet_repository import TweetRepository
+
+TWEET_CACHE_SOFT_TTL = 60 * 60
+TWEET_CACHE_TTL = 60 * 60 * 24
+
+
+def tweet_key(tweet_id: int) -> str:
+    return f"Tweet: {tweet_id}"
+
+
+def tweet_id_from_key(key: str) -> int:
+    return int(key.rsplit(" ", 1)[1])
+
+
+def with_liked_by_me(entry: bytes, liked: bool) -> bytes:
+    # Entries are encoded JSON objects, so the flag is appended without
+    # decoding them.
+    return entry[:-1] + (b',"liked_by_me":true}' if liked else b',"liked_by_me":false}')
+
+
+class TweetCacheRepository:
+    """Feed entries cached one tweet per Redis key.
+
+    Timelines only hold tweet IDs, so a write touches the single cached entry
+    it changes and a page is read back with one MGET. Entries go through a
+    stale-while-revalidate cache, so a cold or expiring entry is rebuilt by
+    one request while concurrent readers wait for it or keep the old copy.
+    """
+
+    def __init__(self, db: AsyncSession, redis_client, writes=None):
+        self.redis = redis_client
+        # The request's write pipeline; cache updates are queued on it.
+        self.writes = writes
+        self.tweet_repo = TweetRepository(db)
+        self.cache = StaleWhileRevalidateCache(
+            redis_client,
+            soft_ttl=TWEET_CACHE_SOFT_TTL,
+            hard_ttl=TWEET_CACHE_TTL,
+            local=local_cache,
+        )
+
+    async def _load(self, keys: List[str]) -> Dict[str, dict]:
+        entries = await self.tweet_repo.assemble_feed(
+            [tweet_id_from_key(key) for key in keys]
+        )
+        return {tweet_key(entry["id"]): entry for entry in entries}
+
+    async def get_tweets_raw(self, tweet_ids: List[int], viewer_id: int) -> List[bytes]:
+        """Return encoded feed entries for ``tweet_ids`` in the given order,
+        loading cache misses from the database in a single batch.
+
+        Cached entries are shared by all viewers; whether ``viewer_id`` liked
+        each tweet is looked up with one query and added as ``liked_by_me``.
+        """
+        if not tweet_ids:
+            return []
+        keys = [tweet_key(tweet_id) for tweet_id in tweet_ids]
+        entries = await self.cache.get_many_raw(keys, self._load)
+        found = [tweet_id for tweet_id, key in zip(tweet_ids, keys) if key in entries]
+        liked = await self.tweet_repo.get_liked_ids(viewer_id, found)
+        return [
+            with_liked_by_me(entries[tweet_key(tweet_id)], tweet_id in liked)
+            for tweet_id in found
+        ]
+
+    async def get_tweets(self, tweet_ids: List[int], viewer_id: int) -> List[dict]:
+        return [
+            codec.loads(entry)
+            for entry in await self.get_tweets_raw(tweet_ids, viewer_id)
+        ]
+
+    async def refresh(self, tweet_id: int):
+        """Rewrite the cached entry of a tweet that has changed."""
+        entries = await self.tweet_repo.assemble_feed([tweet_id])
+        if entries:
+            await self.cache.set(tweet_key(tweet_id), entries[0], writes=self.writes)
+        else:
+            await self.invalidate(tweet_id)
+
+    async def invalidate(self, tweet_id: int):
+        await self.cache.delete(tweet_key(tweet_id), writes=self.writes)
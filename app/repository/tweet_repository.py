@@ -1,63 +1,272 @@
-from sqlalchemy.orm import Session
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 from app import models, schemas
+from app.database import dialect_insert
+from app.media import media_url, remove_blobs
+from app.repository.media_repository import MediaRepository
+
+# Number of likers embedded in each feed entry; the full list is paginated
+# separately.
+LIKES_SAMPLE_SIZE = 3
 
 
 class TweetRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def create_tweet(self, tweet: schemas.TweetCreate, user_id: int) -> models.Tweet:
+    async def create_tweet(
+        self, tweet: schemas.TweetCreate, user_id: int
+    ) -> models.Tweet:
         db_tweet = models.Tweet(tweet_data=tweet.tweet_data, author_id=user_id)
         self.db.add(db_tweet)
-        self.db.commit()
-        self.db.refresh(db_tweet)
+        await self.db.commit()
+        await self.db.refresh(db_tweet)
 
         if tweet.tweet_media_ids:
-            media_list = (
-                self.db.query(models.Media)
-                .filter(models.Media.id.in_(tweet.tweet_media_ids))
-                .all()
+            await self.db.execute(
+                update(models.Media)
+                .where(models.Media.id.in_(tweet.tweet_media_ids))
+                .values(tweet_id=db_tweet.id)
             )
-            for media in media_list:
-                media.tweet_id = db_tweet.id
-            self.db.add_all(media_list)
-            self.db.commit()
+            await self.db.commit()
 
         return db_tweet
 
-    def delete_tweet(self, tweet_id: int, user_id: int) -> bool:
-        db_tweet = (
-            self.db.query(models.Tweet)
-            .filter(models.Tweet.id == tweet_id, models.Tweet.author_id == user_id)
-            .first()
+    async def get_tweet_by_id(self, tweet_id: int):
+        return await self.db.get(models.Tweet, tweet_id)
+
+    async def delete_tweet(self, tweet_id: int, user_id: int) -> bool:
+        """Delete a tweet with its likes and attachments.
+
+        Likes and media are removed with one set-based DELETE each instead
+        of through the ORM cascade, which would load every row first.
+        """
+        found = await self.db.scalar(
+            select(models.Tweet.id).where(
+                models.Tweet.id == tweet_id, models.Tweet.author_id == user_id
+            )
         )
-        if db_tweet:
-            self.db.delete(db_tweet)
-            self.db.commit()
+        if found:
+            await self.db.execute(
+                delete(models.likes).where(models.likes.c.tweet_id == tweet_id)
+            )
+            media_hashes = await self.db.scalars(
+                delete(models.Media)
+                .where(models.Media.tweet_id == tweet_id)
+                .returning(models.Media.sha256)
+            )
+            media_hashes = [sha256 for sha256 in media_hashes if sha256 is not None]
+            await self.db.execute(
+                delete(models.Tweet).where(models.Tweet.id == tweet_id)
+            )
+            media_repo = MediaRepository(self.db)
+            orphaned = await media_repo.release_blobs(media_hashes)
+            await self.db.commit()
+            await remove_blobs(orphaned, media_repo.get_existing_blobs)
             return True
         return False
 
-    def like_tweet(self, tweet_id: int, user_id: int) -> bool:
-        db_tweet = (
-            self.db.query(models.Tweet).filter(models.Tweet.id == tweet_id).first()
+    async def _change_like_counts(self, tweet_ids: List[int], delta: int):
+        if tweet_ids:
+            await self.db.execute(
+                update(models.Tweet)
+                .where(models.Tweet.id.in_(tweet_ids))
+                .values(like_count=models.Tweet.like_count + delta)
+            )
+
+    async def like_tweet(self, tweet_id: int, user_id: int) -> bool:
+        """Like a tweet; liking it again changes nothing. Returns False if
+        the tweet does not exist."""
+        _, _, existing = await self.batch_like(user_id, [tweet_id], [])
+        return tweet_id in existing
+
+    async def unlike_tweet(self, tweet_id: int, user_id: int) -> bool:
+        """Remove a like, if there is one. Returns False if the tweet does
+        not exist."""
+        _, _, existing = await self.batch_like(user_id, [], [tweet_id])
+        return tweet_id in existing
+
+    async def get_existing_ids(self, tweet_ids: List[int]) -> Set[int]:
+        if not tweet_ids:
+            return set()
+        rows = await self.db.scalars(
+            select(models.Tweet.id).where(models.Tweet.id.in_(tweet_ids))
         )
-        db_user = self.db.query(models.User).filter(models.User.id == user_id).first()
-        if db_tweet and db_user:
-            db_tweet.liked_by.append(db_user)
-            self.db.commit()
-            return True
-        return False
+        return set(rows.all())
 
-    def unlike_tweet(self, tweet_id: int, user_id: int) -> bool:
-        db_tweet = (
-            self.db.query(models.Tweet).filter(models.Tweet.id == tweet_id).first()
+    async def _insert_likes(self, user_id: int, tweet_ids: List[int]) -> List[int]:
+        if not tweet_ids:
+            return []
+        rows = await self.db.scalars(
+            dialect_insert(self.db, models.likes)
+            .values([{"user_id": user_id, "tweet_id": t} for t in tweet_ids])
+            .on_conflict_do_nothing()
+            .returning(models.likes.c.tweet_id)
         )
-        db_user = self.db.query(models.User).filter(models.User.id == user_id).first()
-        if db_tweet and db_user:
-            db_tweet.liked_by.remove(db_user)
-            self.db.commit()
-            return True
-        return False
+        return rows.all()
+
+    async def _delete_likes(self, user_id: int, tweet_ids: List[int]) -> List[int]:
+        if not tweet_ids:
+            return []
+        rows = await self.db.scalars(
+            delete(models.likes)
+            .where(
+                models.likes.c.user_id == user_id,
+                models.likes.c.tweet_id.in_(tweet_ids),
+            )
+            .returning(models.likes.c.tweet_id)
+        )
+        return rows.all()
+
+    async def batch_like(
+        self, user_id: int, like_ids: List[int], unlike_ids: List[int]
+    ) -> Tuple[List[int], List[int], Set[int]]:
+        """Like and unlike many tweets in one transaction.
+
+        Returns the tweets that were newly liked, the ones that were actually
+        unliked, and which of the requested tweets exist.
+        """
+        existing = await self.get_existing_ids(like_ids + unlike_ids)
+        liked = await self._insert_likes(
+            user_id, [t for t in like_ids if t in existing]
+        )
+        unliked = await self._delete_likes(
+            user_id, [t for t in unlike_ids if t in existing]
+        )
+        await self._change_like_counts(liked, 1)
+        await self._change_like_counts(unliked, -1)
+        await self.db.commit()
+        return liked, unliked, existing
+
+    async def import_tweets(
+        self, tweets: List[schemas.TweetCreate], user_id: int
+    ) -> List[int]:
+        """Insert many tweets with one multi-row INSERT, attach their media
+        with one UPDATE and return their IDs in the given order."""
+        if not tweets:
+            return []
+        rows = await self.db.scalars(
+            insert(models.Tweet).returning(
+                models.Tweet.id, sort_by_parameter_order=True
+            ),
+            [{"tweet_data": t.tweet_data, "author_id": user_id} for t in tweets],
+        )
+        tweet_ids = rows.all()
+
+        attachments = {
+            media_id: tweet_id
+            for tweet_id, tweet in zip(tweet_ids, tweets)
+            for media_id in tweet.tweet_media_ids or []
+        }
+        if attachments:
+            await self.db.execute(
+                update(models.Media)
+                .where(models.Media.id.in_(list(attachments)))
+                .values(tweet_id=case(attachments, value=models.Media.id))
+            )
+        await self.db.commit()
+        return tweet_ids
 
-    def get_feed(self):
-        return self.db.query(models.Tweet).all()
+    async def get_liked_ids(self, user_id: int, tweet_ids: List[int]) -> Set[int]:
+        """Return which of ``tweet_ids`` the user has liked."""
+        if not tweet_ids:
+            return set()
+        rows = await self.db.scalars(
+            select(models.likes.c.tweet_id).where(
+                models.likes.c.user_id == user_id,
+                models.likes.c.tweet_id.in_(tweet_ids),
+            )
+        )
+        return set(rows.all())
+
+    async def get_likers(
+        self, tweet_id: int, limit: int, before_user_id: Optional[int] = None
+    ) -> List[models.User]:
+        query = (
+            select(models.User)
+            .join(models.likes, models.likes.c.user_id == models.User.id)
+            .where(models.likes.c.tweet_id == tweet_id)
+        )
+        if before_user_id is not None:
+            query = query.where(models.likes.c.user_id < before_user_id)
+        result = await self.db.scalars(
+            query.order_by(models.likes.c.user_id.desc()).limit(limit)
+        )
+        return result.all()
+
+    async def _get_like_samples(self, tweet_ids: List[int]) -> Dict[int, List[dict]]:
+        ranked = (
+            select(
+                models.likes.c.tweet_id,
+                models.likes.c.user_id,
+                func.row_number()
+                .over(
+                    partition_by=models.likes.c.tweet_id,
+                    order_by=models.likes.c.user_id.desc(),
+                )
+                .label("position"),
+            )
+            .where(models.likes.c.tweet_id.in_(tweet_ids))
+            .subquery()
+        )
+        rows = await self.db.execute(
+            select(ranked.c.tweet_id, models.User.id, models.User.name)
+            .join(models.User, models.User.id == ranked.c.user_id)
+            .where(ranked.c.position <= LIKES_SAMPLE_SIZE)
+            .order_by(ranked.c.tweet_id, ranked.c.position)
+        )
+        samples = defaultdict(list)
+        for tweet_id, user_id, name in rows:
+            samples[tweet_id].append({"user_id": user_id, "name": name})
+        return samples
+
+    async def assemble_feed(self, tweet_ids: List[int]) -> List[dict]:
+        """Build feed entries for the given tweets, newest first.
+
+        Authors are joined, attachments are loaded with one IN query and a
+        sample of at most ``LIKES_SAMPLE_SIZE`` likers per tweet with another,
+        so the number of queries does not depend on the number of tweets or
+        likes.
+        """
+        if not tweet_ids:
+            return []
+        tweets = await self.db.scalars(
+            select(models.Tweet)
+            .options(
+                joinedload(models.Tweet.author),
+                selectinload(models.Tweet.media),
+            )
+            .where(models.Tweet.id.in_(tweet_ids))
+            .order_by(models.Tweet.id.desc())
+            .execution_options(populate_existing=True)
+        )
+        tweets = tweets.all()
+        like_samples = await self._get_like_samples([tweet.id for tweet in tweets])
+        return [
+            {
+                "id": tweet.id,
+                "content": tweet.tweet_data,
+                "attachments": [media_url(media) for media in tweet.media],
+                "author": {"id": tweet.author.id, "name": tweet.author.name},
+                "like_count": tweet.like_count,
+                "likes": like_samples.get(tweet.id, []),
+            }
+            for tweet in tweets
+        ]
+
+    async def get_recent_tweet_ids(
+        self, author_ids: List[int], limit: int, before_id: Optional[int] = None
+    ) -> List[int]:
+        if not author_ids:
+            return []
+        query = select(models.Tweet.id).where(models.Tweet.author_id.in_(author_ids))
+        if before_id is not None:
+            query = query.where(models.Tweet.id < before_id)
+        rows = await self.db.execute(
+            query.order_by(models.Tweet.id.desc()).limit(limit)
+        )
+        return [row.id for row in rows]
@@ -1,31 +1,169 @@
-from sqlalchemy.orm import Session
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from app import models
+from app.database import dialect_insert
 
 
 class UserRepository:
-    def __init__(self, db):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_user_by_api_key(self, api_key: str):
-        return self.db.query(models.User).filter(models.User.api_key == api_key).first()
-
-    def get_user_by_id(self, user_id: int):
-        return self.db.query(models.User).filter(models.User.id == user_id).first()
-
-    def follow_user(self, follower_id: int, followed_id: int) -> bool:
-        follower = self.get_user_by_id(follower_id)
-        followed = self.get_user_by_id(followed_id)
-        if follower and followed:
-            follower.followed.append(followed)
-            self.db.commit()
-            return True
-        return False
-
-    def unfollow_user(self, follower_id: int, followed_id: int) -> bool:
-        follower = self.get_user_by_id(follower_id)
-        followed = self.get_user_by_id(followed_id)
-        if follower and followed:
-            follower.followed.remove(followed)
-            self.db.commit()
-            return True
-        return False
+    async def get_user_by_api_key(self, api_key: str):
+        return await self.db.scalar(
+            select(models.User).where(models.User.api_key == api_key)
+        )
+
+    async def get_user_by_id(self, user_id: int):
+        return await self.db.get(models.User, user_id)
+
+    async def get_follower_ids(self, user_id: int) -> List[int]:
+        rows = await self.db.execute(
+            select(models.followers.c.follower_id).where(
+                models.followers.c.followed_id == user_id
+            )
+        )
+        return [row.follower_id for row in rows]
+
+    async def get_followed_ids(
+        self, user_id: int, among: Optional[List[int]] = None
+    ) -> List[int]:
+        """Return the IDs the user follows, only those in ``among`` if given."""
+        query = select(models.followers.c.followed_id).where(
+            models.followers.c.follower_id == user_id
+        )
+        if among is not None:
+            query = query.where(models.followers.c.followed_id.in_(among))
+        rows = await self.db.execute(query)
+        return [row.followed_id for row in rows]
+
+    async def _get_related_users(
+        self, user_column, other_column, user_id: int, limit: int, before_id
+    ) -> List[models.User]:
+        query = (
+            select(models.User)
+            .join(models.followers, other_column == models.User.id)
+            .where(user_column == user_id)
+        )
+        if before_id is not None:
+            query = query.where(other_column < before_id)
+        result = await self.db.scalars(query.order_by(other_column.desc()).limit(limit))
+        return result.all()
+
+    async def get_followers(
+        self, user_id: int, limit: int, before_id: Optional[int] = None
+    ) -> List[models.User]:
+        """One page of the users following ``user_id``, highest user IDs first."""
+        return await self._get_related_users(
+            models.followers.c.followed_id,
+            models.followers.c.follower_id,
+            user_id,
+            limit,
+            before_id,
+        )
+
+    async def get_following(
+        self, user_id: int, limit: int, before_id: Optional[int] = None
+    ) -> List[models.User]:
+        """One page of the users ``user_id`` follows, highest user IDs first."""
+        return await self._get_related_users(
+            models.followers.c.follower_id,
+            models.followers.c.followed_id,
+            user_id,
+            limit,
+            before_id,
+        )
+
+    async def count_followers(self, user_id: int) -> int:
+        return await self.db.scalar(
+            select(models.User.follower_count).where(models.User.id == user_id)
+        )
+
+    async def _change_follow_counts(
+        self, follower_id: int, followed_ids: List[int], delta: int
+    ):
+        if not followed_ids:
+            return
+        await self.db.execute(
+            update(models.User)
+            .where(models.User.id == follower_id)
+            .values(
+                following_count=models.User.following_count + delta * len(followed_ids)
+            )
+        )
+        await self.db.execute(
+            update(models.User)
+            .where(models.User.id.in_(followed_ids))
+            .values(follower_count=models.User.follower_count + delta)
+        )
+
+    async def follow_user(self, follower_id: int, followed_id: int) -> bool:
+        """Follow a user; following them again changes nothing. Returns False
+        if the user does not exist."""
+        _, _, existing = await self.batch_follow(follower_id, [followed_id], [])
+        return followed_id in existing
+
+    async def unfollow_user(self, follower_id: int, followed_id: int) -> bool:
+        """Stop following a user, if followed. Returns False if the user does
+        not exist."""
+        _, _, existing = await self.batch_follow(follower_id, [], [followed_id])
+        return followed_id in existing
+
+    async def get_existing_ids(self, user_ids: List[int]) -> Set[int]:
+        if not user_ids:
+            return set()
+        rows = await self.db.scalars(
+            select(models.User.id).where(models.User.id.in_(user_ids))
+        )
+        return set(rows.all())
+
+    async def _insert_follows(
+        self, follower_id: int, followed_ids: List[int]
+    ) -> List[int]:
+        if not followed_ids:
+            return []
+        rows = await self.db.scalars(
+            dialect_insert(self.db, models.followers)
+            .values(
+                [{"follower_id": follower_id, "followed_id": f} for f in followed_ids]
+            )
+            .on_conflict_do_nothing()
+            .returning(models.followers.c.followed_id)
+        )
+        return rows.all()
+
+    async def _delete_follows(
+        self, follower_id: int, followed_ids: List[int]
+    ) -> List[int]:
+        if not followed_ids:
+            return []
+        rows = await self.db.scalars(
+            delete(models.followers)
+            .where(
+                models.followers.c.follower_id == follower_id,
+                models.followers.c.followed_id.in_(followed_ids),
+            )
+            .returning(models.followers.c.followed_id)
+        )
+        return rows.all()
+
+    async def batch_follow(
+        self, follower_id: int, follow_ids: List[int], unfollow_ids: List[int]
+    ) -> Tuple[List[int], List[int], Set[int]]:
+        """Follow and unfollow many users in one transaction.
+
+        Returns the users that were newly followed, the ones that were actually
+        unfollowed, and which of the requested users exist.
+        """
+        existing = await self.get_existing_ids(follow_ids + unfollow_ids)
+        followed = await self._insert_follows(
+            follower_id, [u for u in follow_ids if u in existing]
+        )
+        unfollowed = await self._delete_follows(
+            follower_id, [u for u in unfollow_ids if u in existing]
+        )
+        await self._change_follow_counts(follower_id, followed, 1)
+        await self._change_follow_counts(follower_id, unfollowed, -1)
+        await self.db.commit()
+        return followed, unfollowed, existing
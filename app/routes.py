@@ -1,335 +1,579 @@
-import json
 import logging
-import os
-
-from fastapi import APIRouter, HTTPException, Depends, Header, UploadFile, File
-from sqlalchemy.orm import Session
-from app import schemas, models
+from typing import List, Optional, Set
+
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Depends,
+    Header,
+    Query,
+    UploadFile,
+    File,
+)
+from fastapi.responses import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import codec, schemas
 from app.repository.user_repository import UserRepository
 from app.repository.tweet_repository import TweetRepository
 from app.repository.media_repository import MediaRepository
-from app.database import get_db
-
-import redis
-
+from app.repository.timeline_repository import TimelineRepository
+from app.repository.tweet_cache_repository import TweetCacheRepository
+from app.repository.search_repository import SearchRepository
+from app.database import (
+    get_db,
+    get_engine,
+    get_replica_engine,
+    get_session_factory,
+    pool_stats,
+)
+from app.pagination import Page, RankedPage
+from app.rate_limit import (
+    rate_limit_engagement,
+    rate_limit_reads,
+    rate_limit_writes,
+)
+from app.rebuild import rebuild_scheduler
+from app.redis_client import get_cache_writes, redis_client
+from app.auth import get_current_user
+from app.cache import StaleWhileRevalidateCache
+from app.config import settings
+from app.local_cache import local_cache
+from app.media import (
+    SHA256_PATTERN,
+    blob_response,
+    discard_upload,
+    publish_upload,
+    save_uploaded_file,
+)
+from app.replica import get_read_db, get_write_db
 
 router = APIRouter()
 
-redis_client = redis.StrictRedis(host="redis", port="6379")
+logger = logging.getLogger(__name__)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler("app.log"), logging.StreamHandler()],
+PROFILE_CACHE_SOFT_TTL = 60
+PROFILE_CACHE_TTL = 60 * 60 * 24
+
+profile_cache = StaleWhileRevalidateCache(
+    redis_client,
+    soft_ttl=PROFILE_CACHE_SOFT_TTL,
+    hard_ttl=PROFILE_CACHE_TTL,
+    local=local_cache,
 )
 
-logger = logging.getLogger(__name__)
 
+def unique_ids(ids: List[int]) -> List[int]:
+    return list(dict.fromkeys(ids))
+
+
+def batch_items(
+    action: str,
+    requested: List[int],
+    changed: List[int],
+    existing: Set[int],
+    unchanged_status: str,
+) -> List[dict]:
+    changed = set(changed)
+    done_status = f"{action}d" if action.endswith("e") else f"{action}ed"
+    return [
+        {
+            "id": item_id,
+            "action": action,
+            "status": (
+                done_status
+                if item_id in changed
+                else unchanged_status if item_id in existing else "not_found"
+            ),
+        }
+        for item_id in requested
+    ]
 
-def save_uploaded_file(file: UploadFile):
-    upload_folder = "app/static"
-    if not os.path.exists(upload_folder):
-        os.makedirs(upload_folder)
-    file_path = os.path.join(upload_folder, file.filename)
-    with open(file_path, "wb") as buffer:
-        buffer.write(file.file.read())
-    logger.info(f"Uploaded file saved at {file_path}")
-    return file.filename
 
+async def tweets_response(
+    db: AsyncSession, tweet_ids: List[int], next_cursor: Optional[str], viewer_id: int
+):
+    # ``db`` fills the shared feed entry cache and must be the primary.
+    cache_repo = TweetCacheRepository(db, redis_client)
+
+    if settings.cache_raw_responses:
+        tweets = await cache_repo.get_tweets_raw(tweet_ids, viewer_id)
+        return Response(
+            b'{"result":true,"tweets":['
+            + b",".join(tweets)
+            + b'],"next_cursor":'
+            + codec.dumps(next_cursor)
+            + b"}",
+            media_type="application/json",
+        )
 
-def update_feed_cache(db: Session):
-    """Update the Redis cache for the tweet feed."""
-    tweet_repo = TweetRepository(db)
-    tweets_data = tweet_repo.get_feed()
-
-    if not tweets_data:
-        raise HTTPException(status_code=404, detail="No tweets found")
-
-    tweets = []
-    for tweet in tweets_data:
-        media = [media.file_path for media in tweet.media]
-        likes = [{"user_id": user.id, "name": user.name} for user in tweet.liked_by]
-        tweet_dict = {
-            "id": tweet.id,
-            "content": tweet.tweet_data,
-            "attachments": media,
-            "author": {"id": tweet.author.id, "name": tweet.author.name},
-            "likes": likes,
-        }
-        tweets.append(tweet_dict)
+    return {
+        "result": True,
+        "tweets": await cache_repo.get_tweets(tweet_ids, viewer_id),
+        "next_cursor": next_cursor,
+    }
 
-    redis_client.set("Feed", json.dumps(tweets))
-    logger.info("Feed cache updated in Redis with key: Feed")
 
+def profile_key(user_id: int) -> str:
+    return f"User: {user_id}"
 
-@router.post("/tweets", response_model=schemas.TweetCreateResponse)
-def make_tweet(
-    tweet: schemas.TweetCreate,
-    api_key: str = Header(...),
-    db: Session = Depends(get_db),
+
+async def profile_response(
+    db: AsyncSession, user_id: int, viewer_id: Optional[int] = None
 ):
-    user_repo = UserRepository(db)
-    tweet_repo = TweetRepository(db)
+    """A user's profile with follower and following counts, cached under
+    :func:`profile_key` for both /users/me and /users/{user_id}. Write routes
+    that change a profile delete the key; ``db`` must be the primary.
+
+    With ``viewer_id``, whether the viewer follows the user is looked up
+    separately, since the cached payload is shared by all viewers.
+    """
+
+    async def load_profile():
+        user_profile = await UserRepository(db).get_user_by_id(user_id)
+        if not user_profile:
+            return None
+
+        user_data = schemas.User.model_validate(user_profile)
+        logger.info(f"User profile cached with key: {profile_key(user_id)}")
+        return {"result": True, "user": user_data.model_dump()}
 
-    user = user_repo.get_user_by_api_key(api_key)
+    payload = await profile_cache.get_raw(profile_key(user_id), load_profile)
+    if payload is None:
+        logger.warning(f"User profile not found for user ID: {user_id}")
+        raise HTTPException(status_code=404, detail="User not found")
+    followed_by_me = False
+    if viewer_id is not None and viewer_id != user_id:
+        followed_by_me = bool(
+            await UserRepository(db).get_followed_ids(viewer_id, among=[user_id])
+        )
+    # The payload is an encoded JSON object, so the flag is appended to it.
+    payload = payload[:-1] + (
+        b',"followed_by_me":true}' if followed_by_me else b',"followed_by_me":false}'
+    )
+    if settings.cache_raw_responses:
+        return Response(payload, media_type="application/json")
+    return codec.loads(payload)
 
-    if not user:
-        logger.warning(f"Invalid API key: {api_key}")
-        raise HTTPException(status_code=403, detail="Invalid API key")
 
-    db_tweet = tweet_repo.create_tweet(tweet, user.id)
+@router.post(
+    "/tweets",
+    response_model=schemas.TweetCreateResponse,
+    dependencies=[Depends(rate_limit_writes)],
+)
+async def make_tweet(
+    tweet: schemas.TweetCreate,
+    user: schemas.CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_write_db),
+    writes=Depends(get_cache_writes),
+):
+    tweet_repo = TweetRepository(db)
+
+    db_tweet = await tweet_repo.create_tweet(tweet, user.id)
     logger.info(f"Tweet created with ID: {db_tweet.id}")
 
-    update_feed_cache(db)
+    await TweetCacheRepository(db, redis_client, writes).refresh(db_tweet.id)
+    await TimelineRepository(db, redis_client, writes).fan_out_tweet(
+        db_tweet.id, user.id
+    )
 
     return {"result": True, "tweet_id": db_tweet.id}
 
 
-@router.post("/medias")
-def upload_media(
-    api_key: str = Header(...),
+@router.post(
+    "/tweets/batch",
+    response_model=schemas.TweetImportResponse,
+    dependencies=[Depends(rate_limit_writes)],
+)
+async def import_tweets(
+    body: schemas.TweetImport,
+    user: schemas.CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_write_db),
+    writes=Depends(get_cache_writes),
+):
+    tweet_ids = await TweetRepository(db).import_tweets(body.tweets, user.id)
+    logger.info(f"Imported {len(tweet_ids)} tweets for user ID: {user.id}")
+
+    await TimelineRepository(db, redis_client, writes).fan_out_tweets(
+        tweet_ids, user.id
+    )
+
+    return {"result": True, "tweet_ids": tweet_ids}
+
+
+@router.post("/medias", dependencies=[Depends(rate_limit_writes)])
+async def upload_media(
+    user: schemas.CurrentUser = Depends(get_current_user),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
+    writes=Depends(get_cache_writes),
 ):
-    user_repo = UserRepository(db)
     media_repo = MediaRepository(db)
 
-    user = user_repo.get_user_by_api_key(api_key)
-    if not user:
-        logger.warning(f"Invalid API key: {api_key}")
-        raise HTTPException(status_code=403, detail="Invalid API key")
-
-    file_path = save_uploaded_file(file)
-    media = media_repo.upload_media(file_path)
+    stored = await save_uploaded_file(file)
+    try:
+        media = await media_repo.upload_media(
+            stored.file_path, stored.size, stored.sha256, file.content_type
+        )
+    except BaseException:
+        await discard_upload(stored)
+        raise
+    # Only now, so that a concurrent remove_blobs() cannot delete the file.
+    await publish_upload(stored)
     logger.info(f"Media uploaded with ID: {media.id}")
 
-    redis_client.set(f"Media: {media.id}", file_path)
+    writes.set(f"Media: {media.id}", stored.file_path)
     logger.info(f"Media cached in Redis with key: Media: {media.id}")
 
-    redis_client.delete("Feed")
-    update_feed_cache(db)
-
     return {"result": True, "media_id": media.id}
 
 
-@router.delete("/tweets/{tweet_id}")
-def delete_tweet(
-    tweet_id: int, api_key: str = Header(...), db: Session = Depends(get_db)
+@router.get("/medias/{sha256}")
+async def get_media(
+    sha256: str,
+    range_header: Optional[str] = Header(None, alias="range"),
+    db: AsyncSession = Depends(get_db),
 ):
-    user_repo = UserRepository(db)
-    tweet_repo = TweetRepository(db)
+    if not SHA256_PATTERN.match(sha256):
+        raise HTTPException(status_code=404, detail="Media not found")
+
+    blob = await MediaRepository(db).get_blob(sha256)
+    if not blob:
+        logger.warning(f"Media blob not found: {sha256}")
+        raise HTTPException(status_code=404, detail="Media not found")
+
+    return await blob_response(sha256, blob.content_type, range_header)
 
-    user = user_repo.get_user_by_api_key(api_key)
-    if not user:
-        logger.warning(f"Invalid API key: {api_key}")
-        raise HTTPException(status_code=403, detail="Invalid API key")
 
-    if not tweet_repo.delete_tweet(tweet_id, user.id):
+@router.delete("/tweets/{tweet_id}", dependencies=[Depends(rate_limit_writes)])
+async def delete_tweet(
+    tweet_id: int,
+    user: schemas.CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_write_db),
+    writes=Depends(get_cache_writes),
+):
+    tweet_repo = TweetRepository(db)
+
+    if not await tweet_repo.delete_tweet(tweet_id, user.id):
         logger.warning(
             f"Tweet not found or unauthorized delete attempt for tweet ID: {tweet_id}"
         )
         raise HTTPException(status_code=404, detail="Tweet not found or unauthorized")
 
-    redis_client.delete(f"Tweet: {tweet_id}")
-
-    update_feed_cache(db)
+    await TweetCacheRepository(db, redis_client, writes).invalidate(tweet_id)
+    await TimelineRepository(db, redis_client, writes).remove_tweet(tweet_id, user.id)
 
     return {"result": True}
 
 
-@router.post("/tweets/{tweet_id}/likes")
-def like_tweet(
-    tweet_id: int, api_key: str = Header(...), db: Session = Depends(get_db)
+@router.post("/tweets/{tweet_id}/likes", dependencies=[Depends(rate_limit_engagement)])
+async def like_tweet(
+    tweet_id: int,
+    user: schemas.CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_write_db),
+    session_factory=Depends(get_session_factory),
 ):
-    user_repo = UserRepository(db)
     tweet_repo = TweetRepository(db)
 
-    user = user_repo.get_user_by_api_key(api_key)
-    if not user:
-        logger.warning(f"Invalid API key: {api_key}")
-        raise HTTPException(status_code=403, detail="Invalid API key")
-
-    if not tweet_repo.like_tweet(tweet_id, user.id):
+    if not await tweet_repo.like_tweet(tweet_id, user.id):
         logger.warning(
             f"Tweet not found or unauthorized like attempt for tweet ID: {tweet_id}"
         )
         raise HTTPException(status_code=404, detail="Tweet not found")
 
-    redis_client.delete(f"Tweet: {tweet_id}")
-    logger.info(
-        f"Tweet removed from Redis cache after like with key: Tweet: {tweet_id}"
-    )
-
-    update_feed_cache(db)
+    await rebuild_scheduler.schedule(tweet_id, session_factory)
+    logger.info(f"Tweet cache refresh scheduled after like for tweet ID: {tweet_id}")
 
     return {"result": True}
 
 
-@router.delete("/tweets/{tweet_id}/likes")
-def unlike_tweet(
-    tweet_id: int, api_key: str = Header(...), db: Session = Depends(get_db)
+@router.delete(
+    "/tweets/{tweet_id}/likes",
+    dependencies=[Depends(rate_limit_engagement)],
+)
+async def unlike_tweet(
+    tweet_id: int,
+    user: schemas.CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_write_db),
+    session_factory=Depends(get_session_factory),
 ):
-    user_repo = UserRepository(db)
     tweet_repo = TweetRepository(db)
 
-    user = user_repo.get_user_by_api_key(api_key)
-    if not user:
-        logger.warning(f"Invalid API key: {api_key}")
-        raise HTTPException(status_code=403, detail="Invalid API key")
-
-    if not tweet_repo.unlike_tweet(tweet_id, user.id):
+    if not await tweet_repo.unlike_tweet(tweet_id, user.id):
         logger.warning(
             f"Tweet not found or unauthorized unlike attempt for tweet ID: {tweet_id}"
         )
         raise HTTPException(status_code=404, detail="Tweet not found")
 
-    redis_client.delete(f"Tweet: {tweet_id}")
+    await rebuild_scheduler.schedule(tweet_id, session_factory)
+    logger.info(f"Tweet cache refresh scheduled after unlike for tweet ID: {tweet_id}")
+
+    return {"result": True}
+
+
+@router.post(
+    "/tweets/likes/batch",
+    response_model=schemas.BatchResponse,
+    dependencies=[Depends(rate_limit_engagement)],
+)
+async def batch_like_tweets(
+    body: schemas.LikeBatch,
+    user: schemas.CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_write_db),
+    session_factory=Depends(get_session_factory),
+):
+    like_ids, unlike_ids = unique_ids(body.like), unique_ids(body.unlike)
+    if set(like_ids) & set(unlike_ids):
+        raise HTTPException(status_code=400, detail="Tweet both liked and unliked")
+
+    liked, unliked, existing = await TweetRepository(db).batch_like(
+        user.id, like_ids, unlike_ids
+    )
+
+    await rebuild_scheduler.schedule_many(liked + unliked, session_factory)
     logger.info(
-        f"Tweet removed from Redis cache after unlike with key: Tweet: {tweet_id}"
+        f"Batch like by user ID {user.id}: {len(liked)} liked, {len(unliked)} unliked"
     )
 
-    update_feed_cache(db)
+    return {
+        "result": True,
+        "items": batch_items("like", like_ids, liked, existing, "already_liked")
+        + batch_items("unlike", unlike_ids, unliked, existing, "not_liked"),
+    }
 
-    return {"result": True}
 
+@router.get(
+    "/tweets/{tweet_id}/likes",
+    response_model=schemas.LikesResponse,
+    dependencies=[Depends(rate_limit_reads)],
+)
+async def get_tweet_likes(
+    tweet_id: int,
+    user: schemas.CurrentUser = Depends(get_current_user),
+    page: Page = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+):
+    tweet_repo = TweetRepository(db)
+
+    if not await tweet_repo.get_tweet_by_id(tweet_id):
+        logger.warning(f"Tweet not found for likes listing, tweet ID: {tweet_id}")
+        raise HTTPException(status_code=404, detail="Tweet not found")
+
+    likers = await tweet_repo.get_likers(tweet_id, page.limit, page.before_id)
 
-@router.post("/users/{user_id}/follow")
-def follow_user(
-    user_id: int, api_key: str = Header(...), db: Session = Depends(get_db)
+    return {
+        "result": True,
+        "likes": [{"user_id": liker.id, "name": liker.name} for liker in likers],
+        "next_cursor": page.next_cursor([liker.id for liker in likers]),
+    }
+
+
+@router.post("/users/{user_id}/follow", dependencies=[Depends(rate_limit_engagement)])
+async def follow_user(
+    user_id: int,
+    user: schemas.CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_write_db),
+    writes=Depends(get_cache_writes),
 ):
     user_repo = UserRepository(db)
 
-    user = user_repo.get_user_by_api_key(api_key)
-    if not user:
-        logger.warning(f"Invalid API key: {api_key}")
-        raise HTTPException(status_code=403, detail="Invalid API key")
-
-    if not user_repo.follow_user(user.id, user_id):
+    if not await user_repo.follow_user(user.id, user_id):
         logger.warning(f"User not found for follow attempt, user ID: {user_id}")
         raise HTTPException(status_code=404, detail="User not found")
 
-    redis_client.delete(f"User: {user_id}")
+    await profile_cache.delete(
+        profile_key(user_id), profile_key(user.id), writes=writes
+    )
     logger.info(
-        f"User profile removed from Redis cache after follow with key: User: {user_id}"
+        f"User profile removed from cache after follow with key: {profile_key(user_id)}"
     )
 
+    await TimelineRepository(db, redis_client, writes).add_author(user.id, user_id)
+
     return {"result": True}
 
 
-@router.delete("/users/{user_id}/follow")
-def unfollow_user(
-    user_id: int, api_key: str = Header(...), db: Session = Depends(get_db)
+@router.delete("/users/{user_id}/follow", dependencies=[Depends(rate_limit_engagement)])
+async def unfollow_user(
+    user_id: int,
+    user: schemas.CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_write_db),
+    writes=Depends(get_cache_writes),
 ):
     user_repo = UserRepository(db)
 
-    user = user_repo.get_user_by_api_key(api_key)
-    if not user:
-        logger.warning(f"Invalid API key: {api_key}")
-        raise HTTPException(status_code=403, detail="Invalid API key")
-
-    if not user_repo.unfollow_user(user.id, user_id):
+    if not await user_repo.unfollow_user(user.id, user_id):
         logger.warning(f"User not found for unfollow attempt, user ID: {user_id}")
         raise HTTPException(status_code=404, detail="User not found")
 
+    await profile_cache.delete(
+        profile_key(user_id), profile_key(user.id), writes=writes
+    )
+
+    await TimelineRepository(db, redis_client, writes).remove_author(user.id, user_id)
+
     return {"result": True}
 
 
-@router.get("/tweets", response_model=schemas.TweetResponse)
-async def get_feed(db: Session = Depends(get_db)):
-    cached_tweets = redis_client.get("Feed")
+@router.post(
+    "/users/follow/batch",
+    response_model=schemas.BatchResponse,
+    dependencies=[Depends(rate_limit_engagement)],
+)
+async def batch_follow_users(
+    body: schemas.FollowBatch,
+    user: schemas.CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_write_db),
+    writes=Depends(get_cache_writes),
+):
+    follow_ids, unfollow_ids = unique_ids(body.follow), unique_ids(body.unfollow)
+    if set(follow_ids) & set(unfollow_ids):
+        raise HTTPException(status_code=400, detail="User both followed and unfollowed")
 
-    if cached_tweets:
-        logger.info("Returning feed from Redis cache")
-        cached_tweets = json.loads(cached_tweets.decode("utf-8"))
-        return {"result": True, "tweets": cached_tweets}
+    followed, unfollowed, existing = await UserRepository(db).batch_follow(
+        user.id, follow_ids, unfollow_ids
+    )
 
-    tweet_repo = TweetRepository(db)
+    changed = followed + unfollowed
+    if changed:
+        await profile_cache.delete(
+            *(profile_key(uid) for uid in changed + [user.id]), writes=writes
+        )
+    timeline_repo = TimelineRepository(db, redis_client, writes)
+    await timeline_repo.add_authors(user.id, followed)
+    await timeline_repo.remove_authors(user.id, unfollowed)
+    logger.info(
+        f"Batch follow by user ID {user.id}: "
+        f"{len(followed)} followed, {len(unfollowed)} unfollowed"
+    )
 
-    tweets_data = tweet_repo.get_feed()
-
-    if not tweets_data:
-        raise HTTPException(status_code=404, detail="No tweets found")
-
-    tweets = []
-    for tweet in tweets_data:
-        media = [media.file_path for media in tweet.media]
-        likes = [{"user_id": user.id, "name": user.name} for user in tweet.liked_by]
-        tweet_dict = {
-            "id": tweet.id,
-            "content": tweet.tweet_data,
-            "attachments": media,
-            "author": {"id": tweet.author.id, "name": tweet.author.name},
-            "likes": likes,
-        }
-        tweets.append(tweet_dict)
+    return {
+        "result": True,
+        "items": batch_items(
+            "follow", follow_ids, followed, existing, "already_following"
+        )
+        + batch_items("unfollow", unfollow_ids, unfollowed, existing, "not_following"),
+    }
 
-    await redis_client.set("Feed", json.dumps(tweets))
-    logger.info("Feed cached in Redis with key: Feed")
 
-    return {"result": True, "tweets": tweets}
+@router.get(
+    "/tweets",
+    response_model=schemas.TweetResponse,
+    dependencies=[Depends(rate_limit_reads)],
+)
+async def get_feed(
+    user: schemas.CurrentUser = Depends(get_current_user),
+    page: Page = Depends(),
+    # Timelines and feed entries are cached for everybody, so they are built
+    # from the primary (see app.replica).
+    db: AsyncSession = Depends(get_db),
+):
+    tweet_ids = await TimelineRepository(db, redis_client).get_timeline(
+        user.id, page.limit, page.before_id
+    )
 
+    logger.info(f"Returning timeline of user ID: {user.id}")
 
-@router.get("/users/me")
-def get_profile(api_key: str = Header(...), db: Session = Depends(get_db)):
-    cached_profile = redis_client.get(f"Profile: {api_key}")
+    return await tweets_response(db, tweet_ids, page.next_cursor(tweet_ids), user.id)
 
-    if cached_profile:
-        logger.info(f"Returning profile from Redis cache for API key: {api_key}")
-        cached_profile = json.loads(cached_profile.decode("utf-8"))
-        return cached_profile
 
-    user_data = db.query(models.User).filter(models.User.api_key == api_key).first()
+@router.get(
+    "/tweets/search",
+    response_model=schemas.TweetResponse,
+    dependencies=[Depends(rate_limit_reads)],
+)
+async def search_tweets(
+    q: str = Query(..., min_length=1),
+    user: schemas.CurrentUser = Depends(get_current_user),
+    page: RankedPage = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    primary: AsyncSession = Depends(get_db),
+):
+    results = await SearchRepository(db).search_tweet_ids(q, page.limit, page.after)
 
-    if user_data:
-        following_list = [{"id": u.id, "name": u.name} for u in user_data.followed]
-        followers_list = [{"id": u.id, "name": u.name} for u in user_data.followers]
+    logger.info(f"Returning {len(results)} search results for user ID: {user.id}")
 
-        profile = {
-            "user": {
-                "id": user_data.id,
-                "name": user_data.name,
-                "following": following_list,
-                "followers": followers_list,
-            },
-        }
+    return await tweets_response(
+        primary,
+        [tweet_id for tweet_id, _ in results],
+        page.next_cursor(results),
+        user.id,
+    )
 
-        redis_client.set(f"Profile: {api_key}", json.dumps(profile))
-        logger.info(f"Profile cached in Redis with key: Profile: {api_key}")
 
-        return {"result": "true", "user": profile}
+@router.get(
+    "/users/me",
+    response_model=schemas.UserProfileResponse,
+    dependencies=[Depends(rate_limit_reads)],
+)
+async def get_profile(
+    user: schemas.CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    return await profile_response(db, user.id)
 
 
-@router.get("/users/{user_id}", response_model=schemas.UserProfileResponse)
-def get_user_profile(
-    user_id: int, api_key: str = Header(...), db: Session = Depends(get_db)
+@router.get(
+    "/users/{user_id}",
+    response_model=schemas.UserProfileResponse,
+    dependencies=[Depends(rate_limit_reads)],
+)
+async def get_user_profile(
+    user_id: int,
+    user: schemas.CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
-    cached_profile = redis_client.get(f"User: {user_id}")
+    return await profile_response(db, user_id, user.id)
 
-    if cached_profile:
-        logger.info(f"Returning user profile from Redis cache for user ID: {user_id}")
-        cached_profile = json.loads(cached_profile.decode("utf-8"))
-        return cached_profile
 
-    user_repo = UserRepository(db)
+async def users_page_response(db: AsyncSession, user_id: int, page: Page, load_page):
+    if not await UserRepository(db).get_user_by_id(user_id):
+        logger.warning(f"User not found for follow listing, user ID: {user_id}")
+        raise HTTPException(status_code=404, detail="User not found")
 
-    user = user_repo.get_user_by_api_key(api_key)
+    users = await load_page(user_id, page.limit, page.before_id)
 
-    if not user:
-        logger.warning(f"Invalid API key: {api_key}")
-        raise HTTPException(status_code=403, detail="Invalid API key")
+    return {
+        "result": True,
+        "users": [{"id": u.id, "name": u.name} for u in users],
+        "next_cursor": page.next_cursor([u.id for u in users]),
+    }
 
-    user_profile = db.query(models.User).filter(models.User.id == user_id).first()
 
-    if not user_profile:
-        logger.warning(f"User profile not found for user ID: {user_id}")
-        raise HTTPException(status_code=404, detail="User not found")
+@router.get(
+    "/users/{user_id}/followers",
+    response_model=schemas.UsersResponse,
+    dependencies=[Depends(rate_limit_reads)],
+)
+async def get_user_followers(
+    user_id: int,
+    user: schemas.CurrentUser = Depends(get_current_user),
+    page: Page = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await users_page_response(
+        db, user_id, page, UserRepository(db).get_followers
+    )
 
-    user_data = schemas.User.from_orm(user_profile)
 
-    profile = {"result": True, "user": user_data}
-    redis_client.set(
-        f"User: {user_id}", json.dumps(profile, default=lambda o: o.dict())
+@router.get(
+    "/users/{user_id}/following",
+    response_model=schemas.UsersResponse,
+    dependencies=[Depends(rate_limit_reads)],
+)
+async def get_user_following(
+    user_id: int,
+    user: schemas.CurrentUser = Depends(get_current_user),
+    page: Page = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await users_page_response(
+        db, user_id, page, UserRepository(db).get_following
     )
-    logger.info(f"User profile cached in Redis with key: User: {user_id}")
 
-    return profile
+
+@router.get("/metrics/db-pool")
+async def get_db_pool_metrics():
+    pools = {"primary": pool_stats(get_engine())}
+    if get_replica_engine() is not None:
+        pools["replica"] = pool_stats(get_replica_engine())
+    return {"result": True, "pools": pools}
@@ -1,6 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
+# Largest number of items accepted by one batch request.
+BATCH_MAX_SIZE = 1000
+
 
 class TweetCreateResponse(BaseModel):
     result: bool
@@ -20,6 +23,11 @@ class Tweet(BaseModel):
         orm_mode = True
 
 
+class CurrentUser(BaseModel):
+    id: int
+    name: str
+
+
 class Author(BaseModel):
     id: int
     name: str
@@ -39,12 +47,28 @@ class TweetData(BaseModel):
     content: str
     attachments: List[str]
     author: Author
+    like_count: int = 0
+    # A sample of the likers, see GET /tweets/{tweet_id}/likes for all.
     likes: List[LikeResponse]
+    liked_by_me: bool = False
 
 
 class TweetResponse(BaseModel):
     result: bool
     tweets: List[TweetData]
+    next_cursor: Optional[str] = None
+
+
+class LikesResponse(BaseModel):
+    result: bool
+    likes: List[LikeResponse]
+    next_cursor: Optional[str] = None
+
+
+class UsersResponse(BaseModel):
+    result: bool
+    users: List[Author]
+    next_cursor: Optional[str] = None
 
 
 class Media(BaseModel):
@@ -58,6 +82,8 @@ class Media(BaseModel):
 class User(BaseModel):
     id: int
     name: str
+    follower_count: int = 0
+    following_count: int = 0
 
     class Config:
         orm_mode = True
@@ -78,7 +104,39 @@ class ErrorResponse(BaseModel):
 class UserProfileResponse(BaseModel):
     result: bool
     user: User
+    # Whether the requesting user follows this one.
+    followed_by_me: bool = False
 
     class Config:
         orm_mode = True
         from_attributes = True
+
+
+class LikeBatch(BaseModel):
+    like: List[int] = Field(default_factory=list, max_length=BATCH_MAX_SIZE)
+    unlike: List[int] = Field(default_factory=list, max_length=BATCH_MAX_SIZE)
+
+
+class FollowBatch(BaseModel):
+    follow: List[int] = Field(default_factory=list, max_length=BATCH_MAX_SIZE)
+    unfollow: List[int] = Field(default_factory=list, max_length=BATCH_MAX_SIZE)
+
+
+class BatchItemResult(BaseModel):
+    id: int
+    action: str
+    status: str
+
+
+class BatchResponse(BaseModel):
+    result: bool
+    items: List[BatchItemResult]
+
+
+class TweetImport(BaseModel):
+    tweets: List[TweetCreate] = Field(..., max_length=BATCH_MAX_SIZE)
+
+
+class TweetImportResponse(BaseModel):
+    result: bool
+    tweet_ids: List[int]
@@ -0,0 +1,86 @@
+"""Full-text index on tweet text.
+
+Postgres keeps a ``tsvector`` column, filled by a trigger on insert and on
+changes to ``tweet_data``, behind a GIN index. SQLite (used by the tests)
+keeps an FTS5 table over ``tweets`` maintained by triggers. Neither is
+mapped on the model; the DDL is attached to the ``tweets`` table so that
+``create_all`` and the migrations install the same objects.
+"""
+
+from sqlalchemy import DDL, Table, event
+
+SEARCH_CONFIG = "simple"
+SEARCH_VECTOR_COLUMN = "search_vector"
+SEARCH_VECTOR_INDEX = "ix_tweets_search_vector"
+FTS_TABLE = "tweets_fts"
+
+POSTGRES_CREATE = [
+    f"ALTER TABLE tweets ADD COLUMN {SEARCH_VECTOR_COLUMN} tsvector",
+    f"CREATE TRIGGER tweets_search_vector_update "
+    f"BEFORE INSERT OR UPDATE OF tweet_data ON tweets FOR EACH ROW "
+    f"EXECUTE FUNCTION tsvector_update_trigger("
+    f"{SEARCH_VECTOR_COLUMN}, 'pg_catalog.{SEARCH_CONFIG}', tweet_data)",
+    f"CREATE INDEX {SEARCH_VECTOR_INDEX} ON tweets USING gin ({SEARCH_VECTOR_COLUMN})",
+]
+
+POSTGRES_BACKFILL = (
+    f"UPDATE tweets SET {SEARCH_VECTOR_COLUMN} = "
+    f"to_tsvector('{SEARCH_CONFIG}', coalesce(tweet_data, ''))"
+)
+
+POSTGRES_DROP = [
+    f"DROP INDEX IF EXISTS {SEARCH_VECTOR_INDEX}",
+    "DROP TRIGGER IF EXISTS tweets_search_vector_update ON tweets",
+    f"ALTER TABLE tweets DROP COLUMN IF EXISTS {SEARCH_VECTOR_COLUMN}",
+]
+
+SQLITE_CREATE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    f"USING fts5(tweet_data, content='tweets', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON tweets BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, tweet_data) VALUES (new.id, new.tweet_data); "
+    f"END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON tweets BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, tweet_data) "
+    f"VALUES ('delete', old.id, old.tweet_data); "
+    f"END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update "
+    f"AFTER UPDATE OF tweet_data ON tweets BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, tweet_data) "
+    f"VALUES ('delete', old.id, old.tweet_data); "
+    f"INSERT INTO {FTS_TABLE}(rowid, tweet_data) VALUES (new.id, new.tweet_data); "
+    f"END",
+]
+
+SQLITE_BACKFILL = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+SQLITE_DROP = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+CREATE = {"postgresql": POSTGRES_CREATE, "sqlite": SQLITE_CREATE}
+BACKFILL = {"postgresql": POSTGRES_BACKFILL, "sqlite": SQLITE_BACKFILL}
+DROP = {"postgresql": POSTGRES_DROP, "sqlite": SQLITE_DROP}
+
+
+def install_search_index(tweets: Table):
+    for dialect, statements in CREATE.items():
+        for statement in statements:
+            event.listen(
+                tweets, "after_create", DDL(statement).execute_if(dialect=dialect)
+            )
+    for statement in SQLITE_DROP:
+        event.listen(tweets, "before_drop", DDL(statement).execute_if(dialect="sqlite"))
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Hide the search objects, which the models do not map, from
+    autogenerate comparisons."""
+    if type_ == "table" and name.startswith(FTS_TABLE):
+        return False
+    if reflected and name in (SEARCH_VECTOR_COLUMN, SEARCH_VECTOR_INDEX):
+        return False
+    return True
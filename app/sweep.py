@@ -0,0 +1,55 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.config import settings
+from app.media import remove_blobs
+from app.repository.media_repository import MediaRepository
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSweeper:
+    """Deletes uploads that were never attached to a tweet.
+
+    Each upload takes a reference on its blob, so an abandoned one would
+    otherwise keep the blob and its file forever. Every worker sweeps every
+    ``media_sweep_interval`` seconds; a row is deleted by exactly one of
+    them, so sweeps running at the same time release each blob once.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def sweep(self, session_factory) -> int:
+        """Delete uploads older than ``media_unattached_ttl`` and return how
+        many blobs were left unreferenced."""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.media_unattached_ttl)
+        async with session_factory() as db:
+            media_repo = MediaRepository(db)
+            orphaned = await media_repo.delete_unattached(cutoff)
+            await db.commit()
+            await remove_blobs(orphaned, media_repo.get_existing_blobs)
+        return len(orphaned)
+
+    async def _run(self, session_factory):
+        while True:
+            await asyncio.sleep(settings.media_sweep_interval)
+            try:
+                await self.sweep(session_factory)
+            except Exception:
+                logger.exception("Sweeping unattached uploads failed")
+
+    def start(self, session_factory):
+        if self._task is None and settings.media_sweep_interval > 0:
+            self._task = asyncio.create_task(self._run(session_factory))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+upload_sweeper = UploadSweeper()
@@ -0,0 +1,186 @@
+"""Seeded synthetic social graph for benchmarks.
+
+The same arguments always produce the same database, so runs made before and
+after a change see identical data. Popularity is skewed the way real social
+networks are:
+
+- followers follow a power law: every user follows a Pareto-distributed
+  number of accounts, picked with Zipf weights, so a few users have most of
+  the followers;
+- a separate Zipf ranking decides who writes most of the tweets;
+- likes land on tweets with Zipf weights, so a few tweets collect most of
+  them.
+
+Counter columns are filled in to match the generated rows.
+"""
+
+import itertools
+import random
+from typing import List, NamedTuple
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.database import Base
+from app.models import Tweet, User, followers, likes
+
+WORDS = (
+    "the a to of and in is it you that this for on with are was be at "
+    "coffee python release bug deploy weekend music football cat dog rain "
+    "train book movie pizza startup cloud database cache redis postgres"
+).split()
+
+# Rows sent per executemany call.
+INSERT_CHUNK_SIZE = 5000
+
+
+class Dataset(NamedTuple):
+    users: int
+    tweets: int
+    follows: int
+    likes: int
+    # User IDs ordered from most to least followed, and tweet IDs from most
+    # to least liked; the load driver uses them to pick realistic targets.
+    popular_users: List[int]
+    popular_tweets: List[int]
+    words: List[str]
+
+
+def api_key(user_id: int) -> str:
+    return f"bench-{user_id}"
+
+
+def zipf_cum_weights(size: int, exponent: float = 1.0) -> List[float]:
+    return list(
+        itertools.accumulate(1.0 / rank**exponent for rank in range(1, size + 1))
+    )
+
+
+def ranked(ids: List[int], rng: random.Random) -> List[int]:
+    """Return ``ids`` in a random popularity order."""
+    ids = list(ids)
+    rng.shuffle(ids)
+    return ids
+
+
+def build_follows(
+    user_ids: List[int], popular: List[int], per_user: int, rng: random.Random
+) -> List[dict]:
+    cum_weights = zipf_cum_weights(len(popular))
+    rows = []
+    for follower_id in user_ids:
+        # Pareto(1.5) has a mean of 3, so out-degrees average ``per_user``.
+        wanted = min(len(user_ids) - 1, int(per_user * rng.paretovariate(1.5) / 3))
+        targets = set(rng.choices(popular, cum_weights=cum_weights, k=wanted))
+        targets.discard(follower_id)
+        rows.extend(
+            {"follower_id": follower_id, "followed_id": followed_id}
+            for followed_id in sorted(targets)
+        )
+    return rows
+
+
+def build_tweets(count: int, user_ids: List[int], rng: random.Random) -> List[dict]:
+    authors = ranked(user_ids, rng)
+    cum_weights = zipf_cum_weights(len(authors))
+    return [
+        {
+            "id": tweet_id,
+            "author_id": author_id,
+            "tweet_data": " ".join(rng.choices(WORDS, k=rng.randint(5, 30))),
+            "like_count": 0,
+        }
+        for tweet_id, author_id in enumerate(
+            rng.choices(authors, cum_weights=cum_weights, k=count), start=1
+        )
+    ]
+
+
+def build_likes(
+    count: int, popular_tweets: List[int], user_ids: List[int], rng: random.Random
+) -> List[dict]:
+    cum_weights = zipf_cum_weights(len(popular_tweets))
+    pairs = set()
+    # Bounded so that a small graph cannot loop forever looking for new pairs.
+    for _ in range(count * 3):
+        if len(pairs) >= count:
+            break
+        tweet_id = rng.choices(popular_tweets, cum_weights=cum_weights)[0]
+        pairs.add((tweet_id, rng.choice(user_ids)))
+    return [{"tweet_id": tweet_id, "user_id": user_id} for tweet_id, user_id in pairs]
+
+
+async def insert_rows(conn, table, rows: List[dict]):
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        await conn.execute(insert(table), rows[start : start + INSERT_CHUNK_SIZE])
+
+
+async def reset_sequences(conn):
+    """Move Postgres ID sequences past the explicitly inserted IDs."""
+    if conn.dialect.name != "postgresql":
+        return
+    for table in ("users", "tweets"):
+        await conn.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+            )
+        )
+
+
+async def generate(
+    engine: AsyncEngine,
+    users: int = 1000,
+    tweets: int = 20000,
+    follows_per_user: int = 20,
+    like_count: int = 50000,
+    seed: int = 1,
+) -> Dataset:
+    """Drop and recreate the schema on ``engine`` and fill it with a graph."""
+    rng = random.Random(seed)
+    user_ids = list(range(1, users + 1))
+    popular_users = ranked(user_ids, rng)
+
+    follow_rows = build_follows(user_ids, popular_users, follows_per_user, rng)
+    tweet_rows = build_tweets(tweets, user_ids, rng)
+    popular_tweets = ranked([row["id"] for row in tweet_rows], rng)
+    like_rows = build_likes(like_count, popular_tweets, user_ids, rng)
+
+    follower_counts = {user_id: 0 for user_id in user_ids}
+    following_counts = dict(follower_counts)
+    for row in follow_rows:
+        follower_counts[row["followed_id"]] += 1
+        following_counts[row["follower_id"]] += 1
+    tweets_by_id = {row["id"]: row for row in tweet_rows}
+    for row in like_rows:
+        tweets_by_id[row["tweet_id"]]["like_count"] += 1
+
+    user_rows = [
+        {
+            "id": user_id,
+            "name": f"user{user_id}",
+            "api_key": api_key(user_id),
+            "follower_count": follower_counts[user_id],
+            "following_count": following_counts[user_id],
+        }
+        for user_id in user_ids
+    ]
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await insert_rows(conn, User.__table__, user_rows)
+        await insert_rows(conn, followers, follow_rows)
+        await insert_rows(conn, Tweet.__table__, tweet_rows)
+        await insert_rows(conn, likes, like_rows)
+        await reset_sequences(conn)
+
+    return Dataset(
+        users=users,
+        tweets=tweets,
+        follows=len(follow_rows),
+        likes=len(like_rows),
+        popular_users=popular_users,
+        popular_tweets=popular_tweets,
+        words=WORDS,
+    )
@@ -0,0 +1,340 @@
+"""Replay a realistic request mix against the ASGI app and report latency.
+
+Run from the repository root:
+
+    python -m benchmarks.load --users 1000 --tweets 20000 --requests 5000
+
+The app runs in-process behind httpx's ASGI transport, so the numbers cover
+routing, dependencies, the database and Redis but no network or server. By
+default the data lives in a local SQLite file and Redis is replaced by an
+in-memory fakeredis server (``pip install fakeredis lupa``); pass
+``--database-url postgresql+asyncpg://...`` and ``--redis-url redis://...``
+to use local servers instead. The database is wiped and reseeded with
+:mod:`benchmarks.dataset` on every run.
+
+Results can be saved with ``--json`` and compared with a previous run with
+``--baseline``, e.g. before and after a change:
+
+    python -m benchmarks.load --json before.json
+    python -m benchmarks.load --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from httpx import ASGITransport, AsyncClient
+from redis import asyncio as redis
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import get_db, get_session_factory
+from app.local_cache import local_cache
+from app.main import app, app_api
+from app.metrics import request_listeners
+from app.rebuild import rebuild_scheduler
+from app.redis_client import redis_client
+from benchmarks.dataset import Dataset, api_key, generate, zipf_cum_weights
+
+# Relative weights of the operations in the replayed mix: mostly timeline
+# reads, some profile and search reads, and a steady trickle of writes.
+MIX = {
+    "read_feed": 45,
+    "view_profile": 12,
+    "view_own_profile": 5,
+    "list_likes": 5,
+    "search": 5,
+    "post_tweet": 8,
+    "like": 10,
+    "unlike": 3,
+    "follow": 4,
+    "unfollow": 3,
+}
+
+PERCENTILES = (50, 95, 99)
+
+# The sample of the request being sent; filled in by the request listener,
+# which runs in the same task as the client call under the ASGI transport.
+current_sample: ContextVar[Optional[dict]] = ContextVar("current_sample", default=None)
+
+
+def record_queries(scope, stats):
+    sample = current_sample.get()
+    if sample is not None:
+        sample["queries"] = stats.queries
+
+
+class LoadDriver:
+    """Sends requests from the operation mix, picking actors uniformly and
+    targets (users to view or follow, tweets to like) by popularity."""
+
+    def __init__(self, client: AsyncClient, dataset: Dataset, seed: int):
+        self.client = client
+        self.dataset = dataset
+        self.rng = random.Random(seed)
+        self.user_weights = zipf_cum_weights(len(dataset.popular_users))
+        self.tweet_weights = zipf_cum_weights(len(dataset.popular_tweets))
+        self.operations = list(MIX)
+        self.operation_weights = list(MIX.values())
+        # Likes and follows made during the run, so that unlike and unfollow
+        # undo something that exists.
+        self.liked: List[tuple] = []
+        self.followed: List[tuple] = []
+
+    def actor(self) -> int:
+        return self.rng.randint(1, self.dataset.users)
+
+    def popular_user(self) -> int:
+        return self.rng.choices(
+            self.dataset.popular_users, cum_weights=self.user_weights
+        )[0]
+
+    def popular_tweet(self) -> int:
+        return self.rng.choices(
+            self.dataset.popular_tweets, cum_weights=self.tweet_weights
+        )[0]
+
+    async def request(self, method: str, path: str, user_id: int, **kwargs):
+        return await self.client.request(
+            method, path, headers={"api-key": api_key(user_id)}, **kwargs
+        )
+
+    async def read_feed(self, user_id: int):
+        return "GET /tweets", await self.request("GET", "/tweets", user_id)
+
+    async def view_profile(self, user_id: int):
+        response = await self.request("GET", f"/users/{self.popular_user()}", user_id)
+        return "GET /users/{user_id}", response
+
+    async def view_own_profile(self, user_id: int):
+        return "GET /users/me", await self.request("GET", "/users/me", user_id)
+
+    async def list_likes(self, user_id: int):
+        response = await self.request(
+            "GET", f"/tweets/{self.popular_tweet()}/likes", user_id
+        )
+        return "GET /tweets/{tweet_id}/likes", response
+
+    async def search(self, user_id: int):
+        query = " ".join(self.rng.sample(self.dataset.words, 2))
+        response = await self.request(
+            "GET", "/tweets/search", user_id, params={"q": query}
+        )
+        return "GET /tweets/search", response
+
+    async def post_tweet(self, user_id: int):
+        content = " ".join(self.rng.choices(self.dataset.words, k=12))
+        response = await self.request(
+            "POST",
+            "/tweets",
+            user_id,
+            json={"tweet_data": content, "tweet_media_ids": []},
+        )
+        return "POST /tweets", response
+
+    async def like(self, user_id: int):
+        tweet_id = self.popular_tweet()
+        response = await self.request("POST", f"/tweets/{tweet_id}/likes", user_id)
+        self.liked.append((user_id, tweet_id))
+        return "POST /tweets/{tweet_id}/likes", response
+
+    async def unlike(self, user_id: int):
+        if not self.liked:
+            return await self.like(user_id)
+        user_id, tweet_id = self.liked.pop(self.rng.randrange(len(self.liked)))
+        response = await self.request("DELETE", f"/tweets/{tweet_id}/likes", user_id)
+        return "DELETE /tweets/{tweet_id}/likes", response
+
+    async def follow(self, user_id: int):
+        followed_id = self.popular_user()
+        response = await self.request("POST", f"/users/{followed_id}/follow", user_id)
+        self.followed.append((user_id, followed_id))
+        return "POST /users/{user_id}/follow", response
+
+    async def unfollow(self, user_id: int):
+        if not self.followed:
+            return await self.follow(user_id)
+        user_id, followed_id = self.followed.pop(self.rng.randrange(len(self.followed)))
+        response = await self.request("DELETE", f"/users/{followed_id}/follow", user_id)
+        return "DELETE /users/{user_id}/follow", response
+
+    async def send_one(self) -> dict:
+        operation = self.rng.choices(self.operations, self.operation_weights)[0]
+        sample = {"queries": 0}
+        current_sample.set(sample)
+        started = time.perf_counter()
+        endpoint, response = await getattr(self, operation)(self.actor())
+        sample["seconds"] = time.perf_counter() - started
+        sample["endpoint"] = endpoint
+        sample["status"] = response.status_code
+        return sample
+
+    async def run(self, requests: int, concurrency: int) -> List[dict]:
+        samples: List[dict] = []
+        remaining = iter(range(requests))
+
+        async def worker():
+            for _ in remaining:
+                samples.append(await self.send_one())
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return samples
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: List[dict], elapsed: float) -> Dict[str, dict]:
+    groups = defaultdict(list)
+    for sample in samples:
+        groups[sample["endpoint"]].append(sample)
+    groups = dict(sorted(groups.items()))
+    groups["all"] = samples
+
+    summary = {}
+    for endpoint, group in groups.items():
+        latencies = sorted(sample["seconds"] for sample in group)
+        summary[endpoint] = {
+            "count": len(group),
+            "throughput": len(group) / elapsed,
+            **{f"p{p}_ms": percentile(latencies, p) * 1000 for p in PERCENTILES},
+            "queries": sum(sample["queries"] for sample in group) / len(group),
+            "errors": sum(1 for sample in group if sample["status"] >= 400),
+        }
+    return summary
+
+
+def print_summary(summary: Dict[str, dict], baseline: Optional[dict] = None):
+    columns = ["count", "throughput"] + [f"p{p}_ms" for p in PERCENTILES]
+    columns += ["queries", "errors"]
+    print(f"{'endpoint':<34}" + "".join(f"{column:>12}" for column in columns))
+    for endpoint, row in summary.items():
+        print(
+            f"{endpoint:<34}" + "".join(f"{row[column]:>12.1f}" for column in columns)
+        )
+        if baseline and endpoint in baseline:
+            changes = [
+                f"{column} {100 * (row[column] / baseline[endpoint][column] - 1):+.1f}%"
+                for column in ("throughput", "p50_ms", "p95_ms", "p99_ms")
+                if baseline[endpoint][column]
+            ]
+            print(f"{'  vs baseline':<34}" + ", ".join(changes))
+
+
+def use_database(url: str):
+    engine = create_async_engine(url)
+    session_factory = async_sessionmaker(
+        bind=engine, autoflush=False, expire_on_commit=False
+    )
+
+    async def override_get_db():
+        async with session_factory() as db:
+            yield db
+
+    for application in (app, app_api):
+        application.dependency_overrides[get_db] = override_get_db
+        application.dependency_overrides[get_session_factory] = lambda: session_factory
+    return engine
+
+
+def use_redis(url: Optional[str]):
+    if url is not None:
+        redis_client.use_pool(redis.ConnectionPool.from_url(url))
+        return
+    try:
+        import fakeredis
+        from fakeredis.aioredis import FakeConnection
+    except ImportError:
+        raise SystemExit("Install fakeredis and lupa, or pass --redis-url.")
+    redis_client.use_pool(
+        redis.ConnectionPool(
+            connection_class=FakeConnection, server=fakeredis.FakeServer()
+        )
+    )
+
+
+async def main(args):
+    engine = use_database(args.database_url)
+    use_redis(args.redis_url)
+    await redis_client.flushdb()
+
+    started = time.perf_counter()
+    dataset = await generate(
+        engine,
+        users=args.users,
+        tweets=args.tweets,
+        follows_per_user=args.follows_per_user,
+        like_count=args.likes,
+        seed=args.seed,
+    )
+    print(
+        f"seeded {dataset.users} users, {dataset.tweets} tweets, "
+        f"{dataset.follows} follows, {dataset.likes} likes "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+    request_listeners.append(record_queries)
+    local_cache.start()
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost:8000/api"
+        ) as client:
+            driver = LoadDriver(client, dataset, args.seed)
+            await driver.run(args.warmup, args.concurrency)
+            started = time.perf_counter()
+            samples = await driver.run(args.requests, args.concurrency)
+            elapsed = time.perf_counter() - started
+    finally:
+        request_listeners.remove(record_queries)
+        await rebuild_scheduler.drain()
+        await local_cache.stop()
+        await redis_client.close()
+        await engine.dispose()
+
+    summary = summarize(samples, elapsed)
+    print(
+        f"{args.requests} requests, concurrency {args.concurrency}, " f"{elapsed:.1f}s"
+    )
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    print_summary(summary, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": summary}, f, indent=2)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./benchmark.db")
+    parser.add_argument(
+        "--redis-url", default=None, help="default: in-process fakeredis"
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--tweets", type=int, default=20000)
+    parser.add_argument("--follows-per-user", type=int, default=20)
+    parser.add_argument("--likes", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare with results saved by --json")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    # Per-request log lines would dominate the measurement.
+    logging.getLogger("app").setLevel(logging.ERROR)
+    asyncio.run(main(parse_args()))
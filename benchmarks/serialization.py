@@ -0,0 +1,101 @@
+"""Compare cache encodings for a realistic feed page.
+
+Run from the repository root:
+
+    python -m benchmarks.serialization
+
+``json`` is the old path: the whole feed is stored as ``json.dumps`` text and
+every cache hit is parsed, validated against ``TweetResponse`` and serialized
+again. ``orjson`` stores one entry per tweet in the cache envelope and a hit
+decodes them back into dicts for FastAPI; ``raw`` joins the stored bytes into
+the response body directly, and ``raw+zlib`` does the same with compressed
+entries.
+"""
+
+import json
+import random
+import timeit
+
+from app import codec, schemas
+from app.config import settings
+
+WORDS = "the a to of and in is it you that this for on with are was be at".split()
+
+
+def make_feed(size: int, seed: int = 1):
+    rng = random.Random(seed)
+    feed = []
+    for tweet_id in range(size, 0, -1):
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 50)))
+        feed.append(
+            {
+                "id": tweet_id,
+                "content": content,
+                "attachments": [
+                    f"/api/medias/{rng.getrandbits(256):064x}"
+                    for _ in range(rng.randint(0, 2))
+                ],
+                "author": {"id": rng.randint(1, 1000), "name": f"User {tweet_id}"},
+                "like_count": rng.randint(0, 5000),
+                "likes": [
+                    {"user_id": rng.randint(1, 1000), "name": f"Liker {i}"}
+                    for i in range(3)
+                ],
+            }
+        )
+    return feed
+
+
+def old_hit(stored: str) -> bytes:
+    tweets = json.loads(stored)
+    response = schemas.TweetResponse.model_validate({"result": True, "tweets": tweets})
+    return response.model_dump_json().encode()
+
+
+def orjson_hit(stored):
+    tweets = [codec.loads(codec.unpack(entry)[0]) for entry in stored]
+    response = schemas.TweetResponse.model_validate({"result": True, "tweets": tweets})
+    return response.model_dump_json().encode()
+
+
+def raw_hit(stored) -> bytes:
+    entries = [codec.unpack(entry)[0] for entry in stored]
+    return b'{"result":true,"tweets":[' + b",".join(entries) + b"]}"
+
+
+def pack_entries(feed, threshold: int):
+    settings.cache_compress_threshold = threshold
+    return [codec.pack(codec.dumps(tweet), 0.0, 0.0) for tweet in feed]
+
+
+def bench(label, func, arg, number):
+    seconds = min(timeit.repeat(lambda: func(arg), number=number, repeat=5))
+    return f"{label:<10} {seconds / number * 1e6:10.1f} us"
+
+
+def main():
+    for size in (20, 100, 800):
+        feed = make_feed(size)
+        number = max(10, 20000 // size)
+
+        old_stored = json.dumps(feed)
+        plain = pack_entries(feed, threshold=0)
+        compressed = pack_entries(feed, threshold=256)
+
+        print(f"feed of {size} tweets")
+        print(f"  stored bytes: json={len(old_stored)}", end=" ")
+        print(f"orjson={sum(map(len, plain))} zlib={sum(map(len, compressed))}")
+        print("  encode:")
+        print("   ", bench("json", json.dumps, feed, number))
+        print(
+            "   ", bench("orjson", lambda f: [codec.dumps(t) for t in f], feed, number)
+        )
+        print("  cache hit to response body:")
+        print("   ", bench("json", old_hit, old_stored, number))
+        print("   ", bench("orjson", orjson_hit, plain, number))
+        print("   ", bench("raw", raw_hit, plain, number))
+        print("   ", bench("raw+zlib", raw_hit, compressed, number))
+
+
+if __name__ == "__main__":
+    main()
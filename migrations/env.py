@@ -0,0 +1,57 @@
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import models  # noqa: F401  (registers the tables on Base.metadata)
+from app.database import SQLALCHEMY_DATABASE_URL, Base
+from app.search import include_object
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get(
+    "configure_logger", True
+):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def get_url() -> str:
+    return config.get_main_option("sqlalchemy.url") or SQLALCHEMY_DATABASE_URL
+
+
+def configure(**kwargs):
+    context.configure(
+        target_metadata=target_metadata,
+        include_object=include_object,
+        # SQLite can only change keys and constraints by copying the table.
+        render_as_batch=get_url().startswith("sqlite"),
+        **kwargs,
+    )
+
+
+def run_migrations_offline():
+    configure(url=get_url(), literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection):
+    configure(connection=connection)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_migrations_online():
+    engine = create_async_engine(get_url())
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
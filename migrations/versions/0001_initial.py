@@ -0,0 +1,63 @@
+"""Initial schema, as created by Base.metadata.create_all before migrations.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("api_key", sa.String()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_name", "users", ["name"])
+    op.create_index("ix_users_api_key", "users", ["api_key"], unique=True)
+
+    op.create_table(
+        "tweets",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("tweet_data", sa.Text()),
+        sa.Column("author_id", sa.Integer(), sa.ForeignKey("users.id")),
+    )
+    op.create_index("ix_tweets_id", "tweets", ["id"])
+    op.create_index("ix_tweets_tweet_data", "tweets", ["tweet_data"])
+
+    op.create_table(
+        "media",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("file_path", sa.String()),
+        sa.Column("tweet_id", sa.Integer(), sa.ForeignKey("tweets.id")),
+    )
+    op.create_index("ix_media_id", "media", ["id"])
+    op.create_index("ix_media_file_path", "media", ["file_path"])
+
+    op.create_table(
+        "followers",
+        sa.Column("follower_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("followed_id", sa.Integer(), sa.ForeignKey("users.id")),
+    )
+    op.create_table(
+        "likes",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("tweet_id", sa.Integer(), sa.ForeignKey("tweets.id")),
+    )
+
+
+def downgrade():
+    op.drop_table("likes")
+    op.drop_table("followers")
+    op.drop_table("media")
+    op.drop_table("tweets")
+    op.drop_table("users")
@@ -0,0 +1,76 @@
+"""Like and follow counters, media hashes and the media blob store.
+
+Databases that were created with create_all after these models changed
+already have some of these objects, so each one is only added when missing.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+COUNTERS = (
+    ("users", "follower_count"),
+    ("users", "following_count"),
+    ("tweets", "like_count"),
+)
+
+
+def _columns(table):
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    for table, column in COUNTERS:
+        if column not in _columns(table):
+            op.add_column(
+                table,
+                sa.Column(column, sa.Integer(), nullable=False, server_default="0"),
+            )
+
+    media_columns = _columns("media")
+    if "size" not in media_columns:
+        op.add_column("media", sa.Column("size", sa.BigInteger()))
+    if "sha256" not in media_columns:
+        op.add_column("media", sa.Column("sha256", sa.String(64)))
+        op.create_index("ix_media_sha256", "media", ["sha256"])
+
+    if not sa.inspect(op.get_bind()).has_table("media_blobs"):
+        op.create_table(
+            "media_blobs",
+            sa.Column("sha256", sa.String(64), primary_key=True),
+            sa.Column("size", sa.BigInteger(), nullable=False),
+            sa.Column("content_type", sa.String()),
+            sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        )
+
+    op.execute(
+        "UPDATE users SET follower_count = (SELECT COUNT(DISTINCT follower_id) "
+        "FROM followers WHERE followers.followed_id = users.id)"
+    )
+    op.execute(
+        "UPDATE users SET following_count = (SELECT COUNT(DISTINCT followed_id) "
+        "FROM followers WHERE followers.follower_id = users.id)"
+    )
+    op.execute(
+        "UPDATE tweets SET like_count = (SELECT COUNT(DISTINCT user_id) "
+        "FROM likes WHERE likes.tweet_id = tweets.id)"
+    )
+
+
+def downgrade():
+    op.drop_table("media_blobs")
+    op.drop_index("ix_media_sha256", table_name="media")
+    with op.batch_alter_table("media") as batch:
+        batch.drop_column("sha256")
+        batch.drop_column("size")
+    for table, column in COUNTERS:
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column(column)
@@ -0,0 +1,79 @@
+"""Composite keys and reverse indexes for followers and likes.
+
+Duplicate and half-empty rows are removed first so the primary keys can be
+created. Tweets get an (author_id, id) index for timeline reads, and the
+B-tree index on tweet text, which no query uses, is dropped.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+KEYS = {
+    "followers": ("follower_id", "followed_id"),
+    "likes": ("tweet_id", "user_id"),
+}
+
+
+def _remove_duplicates(table, columns):
+    first, second = columns
+    op.execute(f"DELETE FROM {table} WHERE {first} IS NULL OR {second} IS NULL")
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            f"DELETE FROM {table} a USING {table} b WHERE a.ctid < b.ctid "
+            f"AND a.{first} = b.{first} AND a.{second} = b.{second}"
+        )
+    else:
+        op.execute(
+            f"DELETE FROM {table} WHERE rowid NOT IN "
+            f"(SELECT MIN(rowid) FROM {table} GROUP BY {first}, {second})"
+        )
+
+
+def upgrade():
+    for table, columns in KEYS.items():
+        _remove_duplicates(table, columns)
+        with op.batch_alter_table(table) as batch:
+            for column in columns:
+                batch.alter_column(column, nullable=False)
+            batch.create_primary_key(f"{table}_pkey", list(columns))
+
+    op.create_index(
+        "ix_followers_followed_id", "followers", ["followed_id", "follower_id"]
+    )
+    op.create_index("ix_likes_user_id", "likes", ["user_id", "tweet_id"])
+    op.create_index("ix_tweets_author_id_id", "tweets", ["author_id", "id"])
+    op.drop_index("ix_tweets_tweet_data", table_name="tweets")
+
+    # Counters were kept while duplicates were possible.
+    op.execute(
+        "UPDATE users SET follower_count = (SELECT COUNT(*) FROM followers "
+        "WHERE followers.followed_id = users.id)"
+    )
+    op.execute(
+        "UPDATE users SET following_count = (SELECT COUNT(*) FROM followers "
+        "WHERE followers.follower_id = users.id)"
+    )
+    op.execute(
+        "UPDATE tweets SET like_count = (SELECT COUNT(*) FROM likes "
+        "WHERE likes.tweet_id = tweets.id)"
+    )
+
+
+def downgrade():
+    op.create_index("ix_tweets_tweet_data", "tweets", ["tweet_data"])
+    op.drop_index("ix_tweets_author_id_id", table_name="tweets")
+    op.drop_index("ix_likes_user_id", table_name="likes")
+    op.drop_index("ix_followers_followed_id", table_name="followers")
+    for table, columns in KEYS.items():
+        with op.batch_alter_table(table) as batch:
+            batch.drop_constraint(f"{table}_pkey", type_="primary")
+            for column in columns:
+                batch.alter_column(column, nullable=True)
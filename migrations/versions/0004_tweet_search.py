@@ -0,0 +1,27 @@
+"""Full-text search index on tweet text.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+
+from app import search
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for statement in search.CREATE[dialect]:
+        op.execute(statement)
+    op.execute(search.BACKFILL[dialect])
+
+
+def downgrade():
+    for statement in search.DROP[op.get_bind().dialect.name]:
+        op.execute(statement)
@@ -0,0 +1,29 @@
+"""Upload time of media, for sweeping uploads that were never attached.
+
+Existing rows count as uploaded now, so the ones still unattached are
+swept once media_unattached_ttl has passed.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("media", sa.Column("uploaded_at", sa.DateTime()))
+    op.execute("UPDATE media SET uploaded_at = CURRENT_TIMESTAMP")
+    op.create_index("ix_media_uploaded_at", "media", ["uploaded_at"])
+
+
+def downgrade():
+    op.drop_index("ix_media_uploaded_at", table_name="media")
+    with op.batch_alter_table("media") as batch:
+        batch.drop_column("uploaded_at")